@@ -99,6 +99,17 @@ def startup_event():
 	app.state.cfg = cfg
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+	"""Close the pooled VLLM HTTP clients."""
+	# Generators import vllm_client via sys.path, the chat endpoint as chat.vllm_client
+	for name in ("vllm_client", "chat.vllm_client"):
+		client_module = sys.modules.get(name)
+		if client_module is not None:
+			client_module.close_client()
+			await client_module.aclose_async_client()
+
+
 @app.get("/")
 def root():
 	"""Root endpoint - API info."""
@@ -448,7 +459,6 @@ def chat_with_course_content(req: ChatRequest):
 		from langchain_core.prompts import ChatPromptTemplate
 		from langchain.chains.combine_documents import create_stuff_documents_chain
 		from langchain.chains import create_retrieval_chain
-		import asyncio
 		
 		if not req.userprompt.strip():
 			raise HTTPException(status_code=400, detail="User prompt cannot be empty")
@@ -510,7 +520,7 @@ Answer:"""
 		
 		def llm_func(prompt_text):
 			"""Wrapper function to call LLM with reduced thinking."""
-			return asyncio.run(llm_func_direct(prompt_text))
+			return vllm_client.run_async(llm_func_direct(prompt_text))
 
 		async def llm_func_direct(prompt_text):
 			"""Call LLM with settings to reduce excessive thinking."""
@@ -0,0 +1,234 @@
+"""On-disk caches for VLLM responses.
+
+LLMCache: responses are keyed by the SHA-256 of the request (endpoint, model,
+messages/prompt, max_tokens, temperature) and only cached for low sampling
+temperatures, where repeating the request would reproduce the same output.
+Requires diskcache; without it the cache is disabled.
+
+SemanticCache: responses are keyed by a query embedding and returned for any
+later query whose cosine similarity passes a threshold. Requires faiss.
+
+Configuration via environment variables:
+- LLM_CACHE_ENABLED (default 1)
+- LLM_CACHE_DIR (default sme/data/llm_cache)
+- LLM_CACHE_TTL (seconds, default 604800)
+- LLM_CACHE_MAX_TEMPERATURE (default 0.1)
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+
+class LLMCache:
+    """SHA-256 keyed response cache backed by diskcache.Cache."""
+
+    def __init__(self, path: Path, ttl_seconds: Optional[float] = None,
+                 max_temperature: float = 0.1, enabled: bool = True):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.enabled = enabled and DISKCACHE_AVAILABLE
+        self.hits = 0
+        self.misses = 0
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def _get_cache(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = diskcache.Cache(str(self.path))
+        return self._cache
+
+    def make_key(self, url: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Return the cache key for a request, or None if it should not be cached."""
+        if not self.enabled or payload.get('stream'):
+            return None
+        if payload.get('temperature', 0) > self.max_temperature:
+            return None
+        key_data = {
+            'url': url,
+            'model': payload.get('model'),
+            'messages': payload.get('messages'),
+            'prompt': payload.get('prompt'),
+            'max_tokens': payload.get('max_tokens'),
+            'temperature': payload.get('temperature'),
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached response data for key, or None on a miss."""
+        try:
+            data = self._get_cache().get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            logger.debug(f"LLM cache hit (hits={self.hits}, misses={self.misses})")
+        return data
+
+    def set(self, key: str, data: Any) -> None:
+        """Store response data under key."""
+        try:
+            self._get_cache().set(key, data, expire=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters."""
+        return {'enabled': self.enabled, 'hits': self.hits, 'misses': self.misses}
+
+
+_LLM_CACHE: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Return the process-wide LLMCache configured from the environment."""
+    global _LLM_CACHE
+    if _LLM_CACHE is None:
+        default_dir = Path(__file__).resolve().parent.parent / 'data' / 'llm_cache'
+        ttl = float(os.getenv('LLM_CACHE_TTL', '604800'))
+        _LLM_CACHE = LLMCache(
+            path=Path(os.getenv('LLM_CACHE_DIR', str(default_dir))),
+            ttl_seconds=ttl if ttl > 0 else None,
+            max_temperature=float(os.getenv('LLM_CACHE_MAX_TEMPERATURE', '0.1')),
+            enabled=os.getenv('LLM_CACHE_ENABLED', '1') == '1',
+        )
+    return _LLM_CACHE
+
+
+class SemanticCache:
+    """Nearest-neighbour response cache keyed by query embeddings.
+    
+    Embeddings are L2-normalized and stored in a FAISS IndexFlatIP, so the
+    inner product is cosine similarity. The index and responses are persisted
+    under ``path`` every ``save_every`` inserts and on save().
+    """
+
+    def __init__(self, path: Path, threshold: float = 0.92, save_every: int = 8):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.save_every = save_every
+        self.enabled = FAISS_AVAILABLE
+        self._index = None
+        self._responses: List[str] = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            self._load()
+
+    def _load(self) -> None:
+        index_file = self.path / 'index.faiss'
+        responses_file = self.path / 'responses.json'
+        if not (index_file.exists() and responses_file.exists()):
+            return
+        try:
+            index = faiss.read_index(str(index_file))
+            with open(responses_file, encoding='utf-8') as f:
+                responses = json.load(f)
+            # Responses are renamed into place before the index and only ever
+            # appended to, so a save interrupted between the two renames
+            # leaves extra responses that can be dropped
+            if index.ntotal <= len(responses):
+                self._index, self._responses = index, responses[:index.ntotal]
+            else:
+                logger.warning(f"Semantic cache at {self.path} is inconsistent, starting empty")
+        except Exception as e:
+            logger.warning(f"Failed to load semantic cache from {self.path}: {e}")
+
+    @staticmethod
+    def _as_query(vector) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    def lookup(self, vector) -> Optional[str]:
+        """Return the cached response nearest to vector if it passes the threshold."""
+        if not self.enabled:
+            return None
+        query = self._as_query(vector)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0 or self._index.d != query.shape[1]:
+                return None
+            scores, ids = self._index.search(query, 1)
+            if ids[0][0] < 0 or scores[0][0] < self.threshold:
+                return None
+            logger.debug(f"Semantic cache hit (similarity {scores[0][0]:.3f})")
+            return self._responses[ids[0][0]]
+
+    def add(self, vector, response: str) -> None:
+        """Cache response under vector."""
+        if not self.enabled:
+            return
+        query = self._as_query(vector)
+        with self._lock:
+            if self._index is None or self._index.d != query.shape[1]:
+                # First entry, or the embedding model changed
+                self._index = faiss.IndexFlatIP(query.shape[1])
+                self._responses = []
+            self._index.add(query)
+            self._responses.append(response)
+            self._pending += 1
+            if self._pending >= self.save_every:
+                self._save_locked()
+
+    def save(self) -> None:
+        """Persist pending entries to disk."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._pending:
+                self._save_locked()
+
+    def _save_locked(self) -> None:
+        # Each file is written to a temporary name and renamed into place, so
+        # a crash never leaves a partially written file behind
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            index_tmp = self.path / 'index.faiss.tmp'
+            responses_tmp = self.path / 'responses.json.tmp'
+            faiss.write_index(self._index, str(index_tmp))
+            with open(responses_tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._responses, f, ensure_ascii=False)
+            os.replace(responses_tmp, self.path / 'responses.json')
+            os.replace(index_tmp, self.path / 'index.faiss')
+            self._pending = 0
+        except Exception as e:
+            logger.warning(f"Failed to save semantic cache to {self.path}: {e}")
+
+
+_SEMANTIC_CACHES: Dict[Path, SemanticCache] = {}
+_SEMANTIC_CACHES_LOCK = threading.Lock()
+
+
+def get_semantic_cache(path: Path, threshold: float = 0.92) -> SemanticCache:
+    """Return the process-wide SemanticCache stored at path."""
+    path = Path(path)
+    with _SEMANTIC_CACHES_LOCK:
+        cache = _SEMANTIC_CACHES.get(path)
+        if cache is None:
+            cache = SemanticCache(path, threshold=threshold)
+            _SEMANTIC_CACHES[path] = cache
+        cache.threshold = threshold
+        return cache
@@ -2,9 +2,8 @@ import hydra
 from omegaconf import DictConfig
 from loguru import logger
 import os
-import asyncio
 
-from rag import create_vs, format_sources
+from rag import create_vs, format_sources, resolve_embedding_device
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
@@ -32,7 +31,7 @@ def create_vector_store(cfg: DictConfig):
         cfg.rag.docs_path,
         cfg.rag.vector_store_path,
         cfg.rag.embedding_model_name,
-        "cpu",
+        resolve_embedding_device(cfg.rag.get('embedding_device', 'cpu')),
         course_id=course_id
     )
     
@@ -59,7 +58,7 @@ def chat(cfg: DictConfig, vector_store):
     # Define LLM functions for streaming
     def llm_func(prompt_text):
         """Wrapper function to call async streaming LLM."""
-        return asyncio.run(llm_func_stream(prompt_text))
+        return vllm_client.run_async(llm_func_stream(prompt_text))
 
     async def llm_func_stream(prompt_text):
         """Stream LLM responses asynchronously."""
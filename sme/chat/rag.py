@@ -1,10 +1,13 @@
+import hashlib
 import os
+import pickle
 import re
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator
 from datetime import datetime
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
     DirectoryLoader, TextLoader, UnstructuredPDFLoader, PyPDFLoader,
@@ -30,6 +33,36 @@ try:
 except ImportError:
     ODT_AVAILABLE = False
 
+# Worker threads used to chunk documents concurrently. They share one embedding
+# model whose forward passes already use torch's intra-op threads, so a
+# thread per core would oversubscribe the CPU
+CHUNKING_MAX_WORKERS = int(os.getenv('CHUNKING_MAX_WORKERS', '2'))
+
+# Batch size for embedding forward passes during indexing
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '256'))
+
+# Number of chunks embedded and added to the FAISS index at a time
+INDEX_BATCH_SIZE = int(os.getenv('INDEX_BATCH_SIZE', '1024'))
+
+# Stores with at least this many vectors also get an IVF-PQ copy of their
+# flat index (index_ivfpq.faiss) for sublinear search; quiz_gen loads it
+IVFPQ_MIN_VECTORS = int(os.getenv('IVFPQ_MIN_VECTORS', '50000'))
+IVFPQ_INDEX_FILE = "index_ivfpq.faiss"
+
+# Sentence boundaries used for semantic chunking
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.?!])\s+')
+
+# File type emoji shown next to each source in chat responses
+FILE_TYPE_EMOJI = {
+    '.pdf': '📄',
+    '.docx': '📝', '.doc': '📝',
+    '.txt': '📋', '.md': '📋',
+    '.xlsx': '📊', '.xls': '📊',
+    '.pptx': '📽️', '.ppt': '📽️',
+    '.html': '🌐', '.htm': '🌐',
+    '.json': '📋', '.csv': '📊'
+}
+
 def preprocess_document_content(content: str) -> str:
     """Minimal preprocessing to clean document content while preserving original information."""
     # Only normalize excessive whitespace (keep single spaces, newlines, etc.)
@@ -38,9 +71,21 @@ def preprocess_document_content(content: str) -> str:
     
     return content.strip()
 
+def compute_doc_id(content: str) -> str:
+    """Stable, content-addressed document ID (64-bit blake2b hex digest).
+    
+    Unlike the built-in hash(), this is identical across processes and runs.
+    """
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=8).hexdigest()
+
 def enhance_document_metadata(documents: List[Document]) -> List[Document]:
-    """Add basic metadata to documents for better source tracking and retrieval."""
+    """Add basic metadata to documents for better source tracking and retrieval.
+    
+    Documents whose cleaned content is identical to an earlier one are dropped,
+    so duplicate files are not chunked and embedded twice.
+    """
     enhanced_docs = []
+    seen_doc_ids = set()
     
     for doc in documents:
         # Extract source information
@@ -48,8 +93,14 @@ def enhance_document_metadata(documents: List[Document]) -> List[Document]:
         filename = os.path.basename(source_path)
         file_ext = os.path.splitext(source_path)[1].lower()
         
-        # Create unique document ID
-        doc_id = abs(hash(source_path + str(len(doc.page_content)))) % (10**8)
+        content = preprocess_document_content(doc.page_content)
+        
+        # Content-addressed document ID
+        doc_id = compute_doc_id(content)
+        if doc_id in seen_doc_ids:
+            logger.info(f"Skipping duplicate content in {filename} (doc_id {doc_id})")
+            continue
+        seen_doc_ids.add(doc_id)
         
         # Calculate content statistics
         word_count = len(doc.page_content.split())
@@ -69,7 +120,7 @@ def enhance_document_metadata(documents: List[Document]) -> List[Document]:
         
         # Create enhanced document
         enhanced_doc = Document(
-            page_content=preprocess_document_content(doc.page_content),
+            page_content=content,
             metadata=enhanced_metadata
         )
         enhanced_docs.append(enhanced_doc)
@@ -77,8 +128,114 @@ def enhance_document_metadata(documents: List[Document]) -> List[Document]:
     logger.info(f"Enhanced metadata for {len(enhanced_docs)} documents")
     return enhanced_docs
 
+class PercentileSemanticSplitter:
+    """Semantic splitter that breaks text where adjacent sentences diverge.
+    
+    Same algorithm as langchain_experimental's SemanticChunker with a percentile
+    breakpoint: each sentence is embedded together with its neighbours, and the
+    text is split where the cosine distance between consecutive sentence groups
+    exceeds the given percentile. All sentences of a document are embedded in
+    one batched call and the distance/breakpoint computation is vectorized.
+    """
+
+    def __init__(self, embeddings, breakpoint_percentile: float = 85, buffer_size: int = 1):
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile
+        self.buffer_size = buffer_size
+
+    def split_text(self, text: str) -> List[str]:
+        sentences = [s for s in SENTENCE_SPLIT_RE.split(text) if s]
+        if len(sentences) <= 1:
+            return sentences
+        
+        # Embed each sentence with its neighbours for a smoother signal
+        b = self.buffer_size
+        combined = [
+            " ".join(sentences[max(0, i - b):i + b + 1])
+            for i in range(len(sentences))
+        ]
+        vectors = np.asarray(self.embeddings.embed_documents(combined), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        
+        # Cosine distance between each pair of adjacent sentences
+        distances = 1.0 - np.einsum('ij,ij->i', vectors[:-1], vectors[1:])
+        threshold = np.percentile(distances, self.breakpoint_percentile)
+        breakpoints = (np.flatnonzero(distances > threshold) + 1).tolist()
+        
+        bounds = [0] + breakpoints + [len(sentences)]
+        return [" ".join(sentences[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        return [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
+
+def _chunk_single_document(doc: Document, semantic_splitter, char_splitter,
+                           semantic_chunk_size: int) -> List[Document]:
+    """Chunk one document semantically, falling back to character splitting."""
+    doc_id = doc.metadata.get('doc_id', 0)
+    # (chunk, chunk_id, parent_chunk_index, is_sub_chunk, chunk_method)
+    planned = []
+    
+    try:
+        # Process all documents regardless of size
+        
+        # Try semantic chunking first
+        semantic_chunks = semantic_splitter.split_documents([doc])
+        
+        # Process each semantic chunk
+        for i, chunk in enumerate(semantic_chunks):
+            if len(chunk.page_content) > semantic_chunk_size:
+                # Split large semantic chunks with character splitter
+                sub_chunks = char_splitter.split_documents([chunk])
+                for j, sub_chunk in enumerate(sub_chunks):
+                    # Keep all chunks regardless of size
+                    planned.append((sub_chunk, f"{doc_id}_{i}_{j}", i, True, 'semantic_then_character'))
+            else:
+                # Use semantic chunk as-is
+                planned.append((chunk, f"{doc_id}_{i}", i, False, 'semantic_only'))
+    
+    except Exception as e:
+        logger.warning(f"Semantic chunking failed for {doc.metadata.get('filename', 'unknown')}: {e}")
+        # Fallback to character-based chunking
+        try:
+            char_chunks = char_splitter.split_documents([doc])
+            planned = [
+                (chunk, f"{doc_id}_fallback_{i}", i, False, 'character_fallback')
+                for i, chunk in enumerate(char_chunks)
+            ]
+        except Exception as e2:
+            logger.error(f"All chunking methods failed for {doc.metadata.get('filename', 'unknown')}: {e2}")
+            return []
+    
+    # The final count is known before metadata is written, so each chunk's
+    # metadata is filled in a single pass with direct assignments
+    total_chunks = len(planned)
+    doc_chunks = []
+    for index, (chunk, chunk_id, parent_index, is_sub_chunk, method) in enumerate(planned):
+        metadata = chunk.metadata
+        metadata['chunk_id'] = chunk_id
+        metadata['chunk_index'] = index
+        metadata['parent_chunk_index'] = parent_index
+        metadata['is_sub_chunk'] = is_sub_chunk
+        metadata['chunk_method'] = method
+        metadata['chunk_size'] = len(chunk.page_content)
+        metadata['total_chunks_in_doc'] = total_chunks
+        doc_chunks.append(chunk)
+    
+    logger.info(f"Created {total_chunks} chunks for {doc.metadata.get('filename', 'unknown')}")
+    return doc_chunks
+
 def smart_document_chunking(documents: List[Document], embeddings) -> List[Document]:
-    """Implement intelligent chunking with overlap and size control."""
+    """Implement intelligent chunking with overlap and size control.
+    
+    Documents are chunked concurrently on a thread pool that shares the single
+    embeddings model: torch releases the GIL during inference, so embedding
+    batches for different documents overlap without reloading the model.
+    """
     logger.info("Starting smart document chunking")
     
     # Configure chunking parameters
@@ -87,10 +244,9 @@ def smart_document_chunking(documents: List[Document], embeddings) -> List[Docum
     # No minimum chunk size - keep all chunks
     
     # Primary splitter: Semantic chunking for natural boundaries
-    semantic_splitter = SemanticChunker(
+    semantic_splitter = PercentileSemanticSplitter(
         embeddings,
-        breakpoint_threshold_type="percentile",
-        breakpoint_threshold_amount=85  # More conservative splitting
+        breakpoint_percentile=85  # More conservative splitting
     )
     
     # Fallback splitter: Character-based with overlap
@@ -101,72 +257,21 @@ def smart_document_chunking(documents: List[Document], embeddings) -> List[Docum
         separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
     )
     
-    all_chunks = []
+    if not documents:
+        logger.info("Total chunks created: 0")
+        return []
     
-    for doc in documents:
-        doc_chunks = []
-        
-        try:
-            # Process all documents regardless of size
-            
-            # Try semantic chunking first
-            semantic_chunks = semantic_splitter.split_documents([doc])
-            
-            # Process each semantic chunk
-            for i, chunk in enumerate(semantic_chunks):
-                if len(chunk.page_content) > SEMANTIC_CHUNK_SIZE:
-                    # Split large semantic chunks with character splitter
-                    sub_chunks = char_splitter.split_documents([chunk])
-                    
-                    for j, sub_chunk in enumerate(sub_chunks):
-                        # Keep all chunks regardless of size
-                        sub_chunk.metadata.update({
-                            'chunk_id': f"{doc.metadata.get('doc_id', 0)}_{i}_{j}",
-                            'chunk_index': len(doc_chunks),
-                            'parent_chunk_index': i,
-                            'is_sub_chunk': True,
-                            'chunk_method': 'semantic_then_character',
-                            'chunk_size': len(sub_chunk.page_content)
-                        })
-                        doc_chunks.append(sub_chunk)
-                else:
-                    # Use semantic chunk as-is
-                    chunk.metadata.update({
-                        'chunk_id': f"{doc.metadata.get('doc_id', 0)}_{i}",
-                        'chunk_index': len(doc_chunks),
-                        'parent_chunk_index': i,
-                        'is_sub_chunk': False,
-                        'chunk_method': 'semantic_only',
-                        'chunk_size': len(chunk.page_content)
-                    })
-                    doc_chunks.append(chunk)
-        
-        except Exception as e:
-            logger.warning(f"Semantic chunking failed for {doc.metadata.get('filename', 'unknown')}: {e}")
-            # Fallback to character-based chunking
-            try:
-                char_chunks = char_splitter.split_documents([doc])
-                for i, chunk in enumerate(char_chunks):
-                    # Keep all chunks regardless of size
-                    chunk.metadata.update({
-                        'chunk_id': f"{doc.metadata.get('doc_id', 0)}_fallback_{i}",
-                        'chunk_index': len(doc_chunks),
-                        'parent_chunk_index': i,
-                        'is_sub_chunk': False,
-                        'chunk_method': 'character_fallback',
-                        'chunk_size': len(chunk.page_content)
-                    })
-                    doc_chunks.append(chunk)
-            except Exception as e2:
-                logger.error(f"All chunking methods failed for {doc.metadata.get('filename', 'unknown')}: {e2}")
-                continue
-        
-        # Add total chunk count to each chunk's metadata
-        for chunk in doc_chunks:
-            chunk.metadata['total_chunks_in_doc'] = len(doc_chunks)
-        
-        all_chunks.extend(doc_chunks)
-        logger.info(f"Created {len(doc_chunks)} chunks for {doc.metadata.get('filename', 'unknown')}")
+    max_workers = min(len(documents), CHUNKING_MAX_WORKERS)
+    logger.info(f"Chunking {len(documents)} documents with {max_workers} workers")
+    
+    all_chunks = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map() preserves document order, so chunk ordering is unchanged
+        for doc_chunks in executor.map(
+            lambda doc: _chunk_single_document(doc, semantic_splitter, char_splitter, SEMANTIC_CHUNK_SIZE),
+            documents
+        ):
+            all_chunks.extend(doc_chunks)
     
     logger.info(f"Total chunks created: {len(all_chunks)}")
     return all_chunks
@@ -266,11 +371,32 @@ def load_single_file(file_path: str) -> List[Document]:
     logger.error(f"All loaders failed for {filename}")
     return []
 
+def iter_supported_files(docs_path: str, supported_extensions) -> Iterator[str]:
+    """Recursively yield paths of supported files under docs_path using os.scandir.
+    
+    scandir entries carry their name and file type, so no per-file stat or
+    path re-parsing is needed; the extension is parsed once from entry.name.
+    """
+    try:
+        entries = os.scandir(docs_path)
+    except OSError as e:
+        logger.warning(f"Cannot scan {docs_path}: {e}")
+        return
+    
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_supported_files(entry.path, supported_extensions)
+            elif entry.is_file():
+                stem, dot, ext = entry.name.rpartition('.')
+                if dot and stem and f".{ext.lower()}" in supported_extensions:
+                    yield entry.path
+
 def load_documents_with_error_handling(docs_path: str) -> List[Document]:
     """Load documents from directory supporting multiple file types with comprehensive error handling."""
     documents = []
     failed_files = []
-    processed_files = []
+    processed_count = 0
     
     logger.info(f"Loading documents from {docs_path}")
     
@@ -278,19 +404,9 @@ def load_documents_with_error_handling(docs_path: str) -> List[Document]:
     supported_extensions = set(get_supported_file_types().keys())
     logger.info(f"Supported file types: {', '.join(sorted(supported_extensions))}")
     
-    # Walk through directory and find all supported files
-    for root, dirs, files in os.walk(docs_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_ext = os.path.splitext(file)[1].lower()
-            
-            if file_ext in supported_extensions:
-                processed_files.append(file_path)
-    
-    logger.info(f"Found {len(processed_files)} files to process")
-    
-    # Process each file
-    for file_path in processed_files:
+    # Walk through directory and process each supported file as it is found
+    for file_path in iter_supported_files(docs_path, supported_extensions):
+        processed_count += 1
         try:
             file_docs = load_single_file(file_path)
             if file_docs:
@@ -301,15 +417,124 @@ def load_documents_with_error_handling(docs_path: str) -> List[Document]:
             failed_files.append(file_path)
             logger.error(f"Unexpected error processing {os.path.basename(file_path)}: {e}")
     
+    logger.info(f"Found {processed_count} files to process")
+    
     # Summary logging
     if failed_files:
         logger.warning(f"Failed to load {len(failed_files)} files:")
         for failed_file in failed_files:
             logger.warning(f"  - {os.path.basename(failed_file)}")
     
-    logger.info(f"Successfully loaded {len(documents)} documents from {len(processed_files) - len(failed_files)} files")
+    logger.info(f"Successfully loaded {len(documents)} documents from {processed_count - len(failed_files)} files")
     return documents
 
+def resolve_embedding_device(device) -> str:
+    """Resolve the configured embedding device.
+    
+    "auto" picks CUDA when available; a CUDA device falls back to CPU when
+    torch or a GPU is missing.
+    """
+    device = str(device or "cpu")
+    if device != "auto" and not device.startswith("cuda"):
+        return device
+    try:
+        import torch
+        cuda_available = torch.cuda.is_available()
+    except ImportError:
+        cuda_available = False
+    if not cuda_available:
+        if device != "auto":
+            logger.warning(f"Embedding device {device} requested but CUDA is unavailable, using cpu")
+        return "cpu"
+    return "cuda" if device == "auto" else device
+
+def get_embedding_kwargs(device: str):
+    """Build HuggingFaceEmbeddings model/encode kwargs for the given device.
+    
+    On CUDA the model weights are loaded in fp16, which roughly halves embedding
+    time for index construction. Embeddings are always L2-normalized so inner
+    product and L2 rankings agree.
+    
+    Returns:
+        Tuple of (model_kwargs, encode_kwargs)
+    """
+    model_kwargs = {"device": device}
+    if str(device).startswith("cuda"):
+        model_kwargs["model_kwargs"] = {"torch_dtype": "float16"}
+    encode_kwargs = {"batch_size": EMBEDDING_BATCH_SIZE, "normalize_embeddings": True}
+    return model_kwargs, encode_kwargs
+
+def load_vs_mmap(vs_path: str, embeddings) -> FAISS:
+    """Load a saved FAISS vector store with a zero-copy, memory-mapped index.
+    
+    IO_FLAG_MMAP_IFC maps the flat index's vectors straight from index.faiss
+    instead of reading them into process memory, so the OS page cache backs
+    them. The mapped index is read-only. Falls back to FAISS.load_local if
+    the flag or the mapped read is not supported.
+    """
+    try:
+        import faiss
+        flags = faiss.IO_FLAG_MMAP_IFC | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+        index = faiss.read_index(os.path.join(vs_path, "index.faiss"), flags)
+        with open(os.path.join(vs_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+    except Exception as e:
+        logger.debug(f"Memory-mapped load failed ({e}), using FAISS.load_local")
+        return FAISS.load_local(vs_path, embeddings, allow_dangerous_deserialization=True)
+
+def build_faiss_in_batches(texts: List[Document], embeddings,
+                           batch_size: int = None) -> FAISS:
+    """Build a FAISS vector store by embedding and adding chunks batch by batch.
+    
+    FAISS.from_documents embeds the whole corpus before indexing, so peak memory
+    holds every embedding (plus LangChain's copy). Streaming fixed-size batches
+    bounds the transient embedding memory to a single batch.
+    """
+    batch_size = batch_size or INDEX_BATCH_SIZE
+    vs = None
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        if vs is None:
+            vs = FAISS.from_documents(batch, embeddings)
+        else:
+            vs.add_documents(batch)
+        logger.debug(f"Indexed {min(start + batch_size, len(texts))}/{len(texts)} chunks")
+    return vs
+
+def build_ivfpq_index(vs_path: str, index):
+    """Build an IVF-PQ copy of a flat index and save it next to index.faiss.
+    
+    Vectors are re-added in order, so the store's index_to_docstore_id
+    mapping applies to the copy unchanged. Returns the trained index, or None
+    if the index is not flat or its dimension has no usable PQ split. A
+    failed save is logged and the trained index is still returned.
+    """
+    import faiss
+    if not isinstance(index, faiss.IndexFlat):
+        return None
+    
+    n, d = index.ntotal, index.d
+    # ~39 training points per centroid is the minimum FAISS recommends
+    nlist = max(1, min(4096, n // 39))
+    m = next((m for m in (64, 48, 32, 16, 8) if d % m == 0), None)
+    if m is None:
+        return None
+    
+    logger.info(f"Building IVF{nlist},PQ{m} index for {n} vectors")
+    vectors = index.reconstruct_n(0, n)
+    ivfpq = faiss.index_factory(d, f"IVF{nlist},PQ{m}", index.metric_type)
+    ivfpq.train(vectors)
+    ivfpq.add(vectors)
+    
+    ivfpq_file = os.path.join(vs_path, IVFPQ_INDEX_FILE)
+    try:
+        faiss.write_index(ivfpq, ivfpq_file)
+        logger.info(f"IVF-PQ index saved to {ivfpq_file}")
+    except Exception as e:
+        logger.warning(f"Failed to save IVF-PQ index to {ivfpq_file}: {e}")
+    return ivfpq
+
 def create_vs(docs_path, vs_path, model, device, course_id=None):
     """Enhanced vector store creation with improved document handling.
     
@@ -320,7 +545,12 @@ def create_vs(docs_path, vs_path, model, device, course_id=None):
         device: Device to use for embeddings (cpu/cuda)
         course_id: Optional course ID to use course-specific paths
     """
-    embeddings = HuggingFaceEmbeddings(model_name=model, model_kwargs={"device": device})
+    model_kwargs, encode_kwargs = get_embedding_kwargs(device)
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model,
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs
+    )
     
     # If course_id is provided, use course-specific paths
     if course_id:
@@ -333,7 +563,7 @@ def create_vs(docs_path, vs_path, model, device, course_id=None):
     # Load existing vector store if available
     if os.path.exists(vs_path):
         logger.info(f"Loading existing vector store from {vs_path}")
-        return FAISS.load_local(vs_path, embeddings, allow_dangerous_deserialization=True)
+        return load_vs_mmap(vs_path, embeddings)
 
     logger.info(f"Creating new vector store from documents in {docs_path}")
     
@@ -354,10 +584,16 @@ def create_vs(docs_path, vs_path, model, device, course_id=None):
     
     # Create and save vector store
     logger.info(f"Creating FAISS index with {len(texts)} chunks")
-    vs = FAISS.from_documents(texts, embeddings)
+    vs = build_faiss_in_batches(texts, embeddings)
     vs.save_local(vs_path)
     logger.info(f"Vector store saved to {vs_path}")
     
+    if vs.index.ntotal >= IVFPQ_MIN_VECTORS:
+        try:
+            build_ivfpq_index(vs_path, vs.index)
+        except Exception as e:
+            logger.warning(f"IVF-PQ index build failed: {e}")
+    
     return vs
 
 def format_sources(retrieved_docs) -> str:
@@ -365,37 +601,22 @@ def format_sources(retrieved_docs) -> str:
     if not retrieved_docs:
         return ""
     
-    seen_sources = set()
-    sources = []
+    # Keyed by normalized filename; dict insertion order keeps first-seen ordering
+    sources = {}
 
     for doc in retrieved_docs:
         # Get source information from metadata
         filename = doc.metadata.get('filename', 'Unknown source')
 
         # Normalize to avoid duplicates caused by path differences
-        source_id = f"{filename.strip()}"
-
-        if source_id not in seen_sources:
-            seen_sources.add(source_id)
+        source_id = filename.strip()
 
+        if source_id not in sources:
             # Add file type emoji for better readability
             file_type = doc.metadata.get('file_type', '').lower()
-            emoji = {
-                '.pdf': '📄',
-                '.docx': '📝', '.doc': '📝',
-                '.txt': '📋', '.md': '📋',
-                '.xlsx': '📊', '.xls': '📊',
-                '.pptx': '📽️', '.ppt': '📽️',
-                '.html': '🌐', '.htm': '🌐',
-                '.json': '📋', '.csv': '📊'
-            }.get(file_type, '📄')
-
-            sources.append(f"{emoji} {source_id}")
-
-    # (Optional) Final safety deduplication preserving order
-    sources = list(dict.fromkeys(sources))
-
+            emoji = FILE_TYPE_EMOJI.get(file_type, '📄')
+            sources[source_id] = f"{emoji} {source_id}"
     
     if sources:
-        return f"\n\n**Sources:**\n" + "\n".join(f"• {source}" for source in sources)
+        return f"\n\n**Sources:**\n" + "\n".join(f"• {source}" for source in sources.values())
     return ""
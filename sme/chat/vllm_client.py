@@ -10,15 +10,32 @@ Configuration via environment variables:
 - VLLM_API_KEY (optional, shared or separate)
 - VLLM_TIMEOUT (default 300)
 - VLLM_RETRIES (default 2)
+- VLLM_HTTP2 (default 0; set to 1 to enable HTTP/2)
 """
+import asyncio
+import atexit
 import os
-import time
-from typing import Dict, Any, Optional, AsyncIterator
+import threading
+import weakref
+from typing import Dict, Any, List, Optional, AsyncIterator, Awaitable, TypeVar
 
 import httpx
+from tenacity import (AsyncRetrying, Retrying, retry_if_exception_type,
+                      stop_after_attempt, wait_exponential_jitter)
 import json
 from fastapi import HTTPException
 
+from llm_cache import get_llm_cache
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    _loads = json.loads
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -35,6 +52,27 @@ VLLM_1_7B_MODEL = os.getenv('VLLM_1_7B_MODEL', './Qwen3-1.7B.gguf')
 VLLM_API_KEY = os.getenv('VLLM_API_KEY')
 TIMEOUT = float(os.getenv('VLLM_TIMEOUT', '300'))
 RETRIES = int(os.getenv('VLLM_RETRIES', '2'))
+HTTP2 = os.getenv('VLLM_HTTP2', '0') == '1'
+
+# Process-wide pooled sync client, created on first use
+_CLIENT: Optional[httpx.Client] = None
+_CLIENT_LOCK = threading.Lock()
+_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+
+# Pooled async clients, one per event loop (httpx connections are bound to
+# the loop that opened them, and callers may use several asyncio.run loops)
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+# Timeouts are retried with jittered exponential backoff (connect errors are
+# retried by the transport itself)
+_TIMEOUT_RETRY = dict(
+    stop=stop_after_attempt(RETRIES + 1),
+    wait=wait_exponential_jitter(initial=0.5, max=4),
+    retry=retry_if_exception_type(httpx.TimeoutException),
+    reraise=True,
+)
+
+T = TypeVar('T')
 
 
 def _build_headers(api_key: Optional[str] = None) -> Dict[str, str]:
@@ -46,53 +84,158 @@ def _build_headers(api_key: Optional[str] = None) -> Dict[str, str]:
     return headers
 
 
+def _get_client() -> httpx.Client:
+    """Return the shared client, creating it on first use."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = httpx.Client(
+                    timeout=TIMEOUT,
+                    transport=httpx.HTTPTransport(retries=RETRIES, http2=HTTP2, limits=_LIMITS)
+                )
+    return _CLIENT
+
+
+def close_client() -> None:
+    """Close the shared sync client; it is recreated on next use."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        client, _CLIENT = _CLIENT, None
+    if client is not None:
+        client.close()
+
+
+atexit.register(close_client)
+
+
 def _post(base_url: str, endpoint: str, payload: Dict[str, Any], 
           api_key: Optional[str] = None) -> Dict[str, Any]:
     """Make POST request to VLLM endpoint with retries."""
     url = f"{base_url}/{endpoint}"
     headers = _build_headers(api_key)
     
-    for attempt in range(RETRIES + 1):
-        try:
-            with httpx.Client(timeout=TIMEOUT) as client:
-                response = client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                
-                data = response.json()
-                return {'ok': True, 'data': data}
-                
-        except httpx.TimeoutException:
-            if attempt < RETRIES:
-                time.sleep(2 ** attempt)
-                continue
-            return {'ok': False, 'error': 'Request timeout', 'data': None}
-            
-        except httpx.HTTPStatusError as e:
-            return {'ok': False, 'error': f'HTTP {e.response.status_code}: {e.response.text}', 'data': None}
+    # Low-temperature responses are deterministic enough to serve from cache
+    cache = get_llm_cache()
+    cache_key = cache.make_key(url, payload)
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return {'ok': True, 'data': cached}
+    
+    client = _get_client()
+    
+    try:
+        for attempt in Retrying(**_TIMEOUT_RETRY):
+            with attempt:
+                response = client.post(url, content=_dumps(payload), headers=headers)
+        response.raise_for_status()
+        
+        data = _loads(response.content)
+        if cache_key is not None:
+            cache.set(cache_key, data)
+        return {'ok': True, 'data': data}
             
-        except Exception as e:
-            return {'ok': False, 'error': str(e), 'data': None}
+    except httpx.TimeoutException:
+        return {'ok': False, 'error': 'Request timeout', 'data': None}
+        
+    except httpx.HTTPStatusError as e:
+        return {'ok': False, 'error': f'HTTP {e.response.status_code}: {e.response.text}', 'data': None}
+        
+    except Exception as e:
+        return {'ok': False, 'error': str(e), 'data': None}
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Return the pooled AsyncClient for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(retries=RETRIES, http2=HTTP2, limits=_LIMITS)
+        )
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+async def aclose_async_client() -> None:
+    """Close the pooled AsyncClient of the running event loop, if any."""
+    client = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run a coroutine to completion from synchronous code.
+    
+    Wraps asyncio.run and closes the pooled AsyncClient of that loop
+    afterwards so no connections outlive it.
+    """
+    async def _runner() -> T:
+        try:
+            return await coro
+        finally:
+            await aclose_async_client()
+    return asyncio.run(_runner())
+
+
+async def _apost(base_url: str, endpoint: str, payload: Dict[str, Any],
+                 api_key: Optional[str] = None) -> Dict[str, Any]:
+    """Make async POST request to VLLM endpoint with retries."""
+    url = f"{base_url}/{endpoint}"
+    headers = _build_headers(api_key)
+    
+    cache = get_llm_cache()
+    cache_key = cache.make_key(url, payload)
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return {'ok': True, 'data': cached}
     
-    return {'ok': False, 'error': 'Max retries exceeded', 'data': None}
+    client = _get_async_client()
+    
+    try:
+        async for attempt in AsyncRetrying(**_TIMEOUT_RETRY):
+            with attempt:
+                response = await client.post(url, content=_dumps(payload), headers=headers)
+        response.raise_for_status()
+        
+        data = _loads(response.content)
+        if cache_key is not None:
+            cache.set(cache_key, data)
+        return {'ok': True, 'data': data}
+            
+    except httpx.TimeoutException:
+        return {'ok': False, 'error': 'Request timeout', 'data': None}
+        
+    except httpx.HTTPStatusError as e:
+        return {'ok': False, 'error': f'HTTP {e.response.status_code}: {e.response.text}', 'data': None}
+        
+    except Exception as e:
+        return {'ok': False, 'error': str(e), 'data': None}
 
 
 def _extract_text(result: Dict[str, Any]) -> str:
     """Extract text from VLLM API response."""
-    if not result.get('ok', False):
+    if not result.get('ok'):
         return ''
     
-    data = result.get('data', {})
+    data = result['data']
     
     # VLLM uses OpenAI-compatible format
-    if 'choices' in data and len(data['choices']) > 0:
-        choice = data['choices'][0]
-        if 'message' in choice:
-            return choice['message'].get('content', '')
-        elif 'text' in choice:
-            return choice['text']
+    choices = data.get('choices')
+    if choices:
+        choice = choices[0]
+        message = choice.get('message')
+        if message is not None:
+            return message.get('content', '')
+        text = choice.get('text')
+        if text is not None:
+            return text
     
     # Fallback
-    return data.get('text', data.get('output', ''))
+    return data.get('text') or data.get('output') or ''
 
 
 def infer_4b(prompt: str, max_tokens: int = 1024, temperature: float = 0.7, 
@@ -129,6 +272,115 @@ def infer_4b(prompt: str, max_tokens: int = 1024, temperature: float = 0.7,
         'endpoint': VLLM_4B_URL
     }
 
+async def infer_4b_async(prompt: str, max_tokens: int = 1024, temperature: float = 0.7,
+                         api_key: Optional[str] = None) -> Dict[str, Any]:
+    """Async variant of infer_4b using the pooled AsyncClient.
+
+    Args:
+        prompt: Input text prompt
+        max_tokens: Maximum tokens to generate
+        temperature: Sampling temperature
+        api_key: Optional API key override
+
+    Returns:
+        Dict with {ok: bool, text: str, raw: {...}}
+    """
+    payload = {
+        'model': VLLM_4B_MODEL,
+        'messages': [
+            {'role': 'user', 'content': prompt}
+        ],
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+        'stream': False
+    }
+    
+    res = await _apost(VLLM_4B_URL, 'chat/completions', payload, api_key)
+    text = _extract_text(res)
+    
+    return {
+        'ok': res.get('ok', False), 
+        'text': text, 
+        'raw': res.get('data'),
+        'error': res.get('error'),
+        'model': VLLM_4B_MODEL,
+        'endpoint': VLLM_4B_URL
+    }
+
+async def infer_4b_batch_async(prompts: List[str], max_tokens: int = 1024, temperature: float = 0.7,
+                               api_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Complete several prompts with a single request to the 4B model.
+    
+    Uses the completions endpoint, which accepts a list of prompts and decodes
+    each one independently (returned as choices[i]). No chat template is
+    applied, so prompts should end where the answer starts.
+    
+    Args:
+        prompts: Input text prompts
+        max_tokens: Maximum tokens to generate per prompt
+        temperature: Sampling temperature
+        api_key: Optional API key override
+    
+    Returns:
+        One dict per prompt, in prompt order, with {ok: bool, text: str, error: str}
+    """
+    payload = {
+        'model': VLLM_4B_MODEL,
+        'prompt': prompts,
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+        'stream': False
+    }
+    
+    res = await _apost(VLLM_4B_URL, 'completions', payload, api_key)
+    texts: List[Optional[str]] = [None] * len(prompts)
+    if res.get('ok'):
+        for choice in (res.get('data') or {}).get('choices', []):
+            index = choice.get('index')
+            if isinstance(index, int) and 0 <= index < len(prompts):
+                texts[index] = choice.get('text', '')
+    error = res.get('error') or 'Missing completion choice'
+    
+    return [
+        {
+            'ok': text is not None,
+            'text': text or '',
+            'error': None if text is not None else error,
+            'model': VLLM_4B_MODEL,
+            'endpoint': VLLM_4B_URL
+        }
+        for text in texts
+    ]
+
+async def _iter_stream_content(response: httpx.Response) -> AsyncIterator[str]:
+    """Yield delta content from a streaming (SSE) chat completions response.
+    
+    Works on raw bytes: lines are split out of a bytearray buffer and each
+    'data: ' payload is decoded straight from bytes, skipping the per-line
+    str decoding of aiter_lines.
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()  # Incomplete trailing line
+        for line in lines:
+            if not line.startswith(b'data: '):
+                continue
+            data_bytes = line[6:].strip()  # Remove 'data: ' prefix
+            if data_bytes == b'[DONE]':
+                return
+            try:
+                data = _loads(data_bytes)
+            except ValueError:
+                continue
+            choices = data.get('choices')
+            if choices:
+                content = choices[0].get('delta', {}).get('content')
+                if content:
+                    yield content
+
+
 async def infer_4b_stream(prompt: str, max_tokens: int = 1024, temperature: float = 0.7,
                           api_key: Optional[str] = None) -> AsyncIterator[str]:
     """Stream responses from the 4B model via VLLM.
@@ -158,32 +410,18 @@ async def infer_4b_stream(prompt: str, max_tokens: int = 1024, temperature: floa
     url = f"{VLLM_4B_URL}/chat/completions"
     headers = _build_headers(api_key)
     
-    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-        async with client.stream('POST', url, json=payload, headers=headers) as response:
-            # Check for HTTP errors BEFORE starting to yield
-            try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                error_detail = f"VLLM Error {e.response.status_code}: {e.response.text}"
-                print(f"❌ VLLM streaming error: {error_detail}")
-                raise HTTPException(status_code=502, detail=error_detail)
-            
-            async for line in response.aiter_lines():
-                if line.startswith('data: '):
-                    data_str = line[6:]  # Remove 'data: ' prefix
-                    
-                    if data_str.strip() == '[DONE]':
-                        break
-                    
-                    try:
-                        data = json.loads(data_str)
-                        if 'choices' in data and len(data['choices']) > 0:
-                            delta = data['choices'][0].get('delta', {})
-                            content = delta.get('content', '')
-                            if content:
-                                yield content
-                    except json.JSONDecodeError:
-                        continue
+    client = _get_async_client()
+    async with client.stream('POST', url, content=_dumps(payload), headers=headers) as response:
+        # Check for HTTP errors BEFORE starting to yield
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            error_detail = f"VLLM Error {e.response.status_code}: {e.response.text}"
+            print(f"❌ VLLM streaming error: {error_detail}")
+            raise HTTPException(status_code=502, detail=error_detail)
+        
+        async for content in _iter_stream_content(response):
+            yield content
 
 
 async def infer_4b_stream_no_think(prompt: str, max_tokens: int = 1024, temperature: float = 0.7,
@@ -218,32 +456,18 @@ async def infer_4b_stream_no_think(prompt: str, max_tokens: int = 1024, temperat
     url = f"{VLLM_4B_URL}/chat/completions"
     headers = _build_headers(api_key)
     
-    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-        async with client.stream('POST', url, json=payload, headers=headers) as response:
-            # Check for HTTP errors BEFORE starting to yield
-            try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                error_detail = f"VLLM Error {e.response.status_code}: {e.response.text}"
-                print(f"❌ VLLM streaming error: {error_detail}")
-                raise HTTPException(status_code=502, detail=error_detail)
-            
-            async for line in response.aiter_lines():
-                if line.startswith('data: '):
-                    data_str = line[6:]  # Remove 'data: ' prefix
-                    
-                    if data_str.strip() == '[DONE]':
-                        break
-                    
-                    try:
-                        data = json.loads(data_str)
-                        if 'choices' in data and len(data['choices']) > 0:
-                            delta = data['choices'][0].get('delta', {})
-                            content = delta.get('content', '')
-                            if content:
-                                yield content
-                    except json.JSONDecodeError:
-                        continue
+    client = _get_async_client()
+    async with client.stream('POST', url, content=_dumps(payload), headers=headers) as response:
+        # Check for HTTP errors BEFORE starting to yield
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            error_detail = f"VLLM Error {e.response.status_code}: {e.response.text}"
+            print(f"❌ VLLM streaming error: {error_detail}")
+            raise HTTPException(status_code=502, detail=error_detail)
+        
+        async for content in _iter_stream_content(response):
+            yield content
 
 
 def infer_1_7b(prompt: str, max_tokens: int = 1024, temperature: float = 0.3,
@@ -283,21 +507,25 @@ def infer_1_7b(prompt: str, max_tokens: int = 1024, temperature: float = 0.3,
 
 # Compatibility function for health checks
 def check_model_health(model_type: str = '4b') -> Dict[str, Any]:
-    """Check if a VLLM model endpoint is healthy."""
+    """Check if a VLLM model endpoint is healthy.
+    
+    Queries the server's /health endpoint, so no inference is run.
+    """
     try:
         url = VLLM_4B_URL if model_type == '4b' else VLLM_1_7B_URL
+        model = VLLM_4B_MODEL if model_type == '4b' else VLLM_1_7B_MODEL
         print(f"🔍 Testing connection to {url}")
         
-        if model_type == '4b':
-            result = infer_4b("ping", max_tokens=5)
-        else:
-            result = infer_1_7b("ping", max_tokens=5)
+        # /health is served at the server root, not under /v1
+        base_url = url[:-3] if url.endswith('/v1') else url
+        response = _get_client().get(f"{base_url}/health", timeout=5.0)
+        healthy = response.status_code == 200
         
         return {
-            'healthy': result.get('ok', False),
-            'model': result.get('model'),
-            'endpoint': result.get('endpoint'),
-            'error': None if result.get('ok') else 'Model not responding'
+            'healthy': healthy,
+            'model': model,
+            'endpoint': url,
+            'error': None if healthy else f'Health check returned HTTP {response.status_code}'
         }
     except Exception as e:
         error_msg = str(e)
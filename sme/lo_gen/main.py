@@ -2,19 +2,31 @@
 
 Generates learning objectives for educational modules using LLM and vector store retrieval.
 """
+import asyncio
+import functools
 import json
 import os
 import re
 import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple, Set
 
-from dotenv import load_dotenv
+import numpy as np
 import hydra
 from omegaconf import DictConfig
 from loguru import logger
 
-from vllm_client import VLLM_4B_URL, infer_4b
+from vllm_client import VLLM_4B_URL, VLLM_4B_MODEL, infer_4b_async, infer_4b_stream, run_async
+
+# orjson parses model output several times faster than the stdlib; its
+# JSONDecodeError subclasses json.JSONDecodeError, so handlers work for both
+try:
+    import orjson
+    _loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _loads = json.loads
+    ORJSON_AVAILABLE = False
 
 try:
     from langchain_community.vectorstores import FAISS
@@ -28,6 +40,81 @@ except ImportError:
 os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
 PROJECT_ROOT = Path(__file__).parent.parent
 
+# Precompiled patterns used when parsing model output
+_SIMPLE_JSON_RE = re.compile(r'\[\s*"[^"]*"(?:\s*,\s*"[^"]*")*\s*\]', re.DOTALL)
+_THINK_SPLIT_RE = re.compile(r'/think', re.IGNORECASE)
+_ARRAY_TOKEN_RE = re.compile(r'[\[\]"]')
+_STRING_ARRAY_START_RE = re.compile(r'\[\s*"')
+_PLACEHOLDER_PREFIX_RE = re.compile(r'^\s*(?:lo\d*|objective)\b', re.IGNORECASE)
+
+# Objective validation vocabulary
+_ACTION_VERBS = frozenset({
+    # Learning-focused verbs
+    'understand', 'explain', 'describe', 'identify', 'recognize', 'recall',
+    'comprehend', 'interpret', 'summarize', 'classify', 'distinguish',
+    # Analysis verbs
+    'analyze', 'compare', 'contrast', 'examine', 'investigate', 'explore',
+    'evaluate', 'assess', 'critique', 'justify', 'determine', 'derive',
+    # Application verbs (theoretical application)
+    'apply', 'demonstrate', 'illustrate', 'relate', 'use', 'employ'
+})
+_PLACEHOLDER_PATTERNS = (
+    'lo1', 'lo2', 'lo3', 'lo4', 'lo5', 'lo6',
+    'objective 1', 'objective 2', 'objective 3',
+    'learning objective', 'new objective', 'additional objective'
+)
+_PLACEHOLDER_RE = re.compile('|'.join(map(re.escape, _PLACEHOLDER_PATTERNS)))
+_LO_PLACEHOLDER_PREFIXES = ('lo', 'objective', 'learning objective')
+_OBJ_PLACEHOLDER = 1  # _obj_status bits
+_OBJ_TOO_SHORT = 2
+_OBJECTIVE_RES = (
+    re.compile(r'\d+\.\s+([A-Z][^.]+\.?)', re.MULTILINE),  # "1. Understand the concept..."
+    re.compile(r'^\s*-\s+([A-Z][^.]+\.?)', re.MULTILINE),  # "- Analyze the framework..."
+    re.compile(r'Objective \d+[:\.]?\s+([A-Z][^.]+\.?)', re.MULTILINE),  # "Objective 1: Explain..."
+)
+_MAX_PATTERN_OBJECTIVES = 20  # Strategy 3 stops collecting candidates here
+_THINKING_RES = tuple(re.compile(p, re.DOTALL | re.IGNORECASE) for p in (
+    r'</think>\s*(.*)',
+    r'<think>.*?</think>\s*(.*)',
+    r'<thinking>.*?</thinking>\s*(.*)',
+    r'Output the JSON array now:\s*(.*)',
+    r'(?:Here is|Here are) (?:the|my) .*?:\s*(.*)',
+))
+
+# Prompts for the generation loops; only the variable parts are substituted per call
+_MAIN_PROMPT = (
+    "Generate exactly {n_los} complete learning objectives for the module: {module}\n\n"
+    "Context: {context}\n\n"
+    "CRITICAL REQUIREMENTS:\n"
+    "- Each objective must be 8-18 words long\n"
+    "- Start with action verbs: Understand, Explain, Analyze, Compare, Evaluate, Describe, Apply\n"
+    "- Must be actual learning objectives, NOT placeholders like 'LO1', 'LO2'\n"
+    "- Focus on theoretical and conceptual understanding\n"
+    "- Output ONLY a JSON array of strings\n\n"
+    "Example format: [\"Understand the fundamental principles of quantum mechanics in field theory\", \"Analyze the mathematical foundations of relativistic quantum field equations\"]\n\n"
+    "Generate {n_los} actual learning objectives now:"
+)
+_ADDITIONAL_PROMPT = (
+    "Generate {remaining} MORE learning objectives for: {module}\n\n"
+    "Focus area: {focus}\n"
+    "Context: {context}\n\n"
+    "AVOID these already covered topics: {covered_topics}\n\n"
+    "Requirements:\n"
+    "- Each objective: 8-18 words\n"
+    "- Start with: Understand, Explain, Analyze, Compare, Evaluate, Describe, Apply, Derive\n"
+    "- NO placeholders (LO1, LO2, etc.)\n"
+    "- Must be different from existing objectives\n"
+    "- Focus on {focus}\n\n"
+    "Output exactly {remaining} objectives as JSON array:"
+)
+_FOCUS_AREAS = (
+    "theoretical foundations and principles",
+    "mathematical analysis and derivations",
+    "conceptual understanding and interpretation",
+    "comparison and evaluation of different approaches",
+    "application of theories and methods",
+)
+
 # ============================================================================
 # Vector Store Functions
 # ============================================================================
@@ -74,33 +161,44 @@ def load_vector_store(cfg: DictConfig):
         return None
 
 
-def retrieve_chunks_from_vector_store(vector_store, query: str, top_k: int = 5) -> List[Dict]:
-    """Retrieve relevant chunks from vector store.
+def retrieve_chunks_batch(vector_store, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+    """Retrieve chunks for several queries with one embedding call and one FAISS search.
     
     Args:
         vector_store: FAISS vector store instance
-        query: Search query
-        top_k: Number of chunks to retrieve
+        queries: Search queries
+        top_k: Number of chunks to retrieve per query
         
     Returns:
-        List of document chunks with metadata
+        One list of document chunks with metadata per query, in query order
     """
+    if not queries:
+        return []
     try:
-        retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
-        docs = retriever.invoke(query)
+        query_vectors = np.asarray(vector_store.embeddings.embed_documents(queries), dtype=np.float32)
+        if getattr(vector_store, "_normalize_L2", False):
+            query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        _, indices = vector_store.index.search(query_vectors, top_k)
         
-        results = []
-        for i, doc in enumerate(docs):
-            results.append({
-                "title": doc.metadata.get("filename", doc.metadata.get("source", f"doc-{i}")),
-                "text": doc.page_content[:4000],
-                "source_id": i,
-                "metadata": doc.metadata
-            })
-        return results
+        batch_results = []
+        for row in indices:
+            results = []
+            for idx in row:
+                if idx == -1:
+                    continue
+                doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(idx)])
+                i = len(results)
+                results.append({
+                    "title": doc.metadata.get("filename", doc.metadata.get("source", f"doc-{i}")),
+                    "text": doc.page_content[:4000],
+                    "source_id": i,
+                    "metadata": doc.metadata
+                })
+            batch_results.append(results)
+        return batch_results
     except Exception as e:
-        logger.error(f"Failed to retrieve from vector store: {e}")
-        return []
+        logger.error(f"Failed to batch retrieve from vector store: {e}")
+        return [[] for _ in queries]
 
 
 def keyword_search(cfg: DictConfig, query: str, max_docs: int = 5) -> List[Dict]:
@@ -144,6 +242,136 @@ def keyword_search(cfg: DictConfig, query: str, max_docs: int = 5) -> List[Dict]
 # Parsing and Validation
 # ============================================================================
 
+@functools.lru_cache(maxsize=4096)
+def _obj_status(obj: str) -> int:
+    """Quick-reject status of an objective as a bitmask (0 means acceptable).
+    
+    _OBJ_PLACEHOLDER is set for placeholders ("LO1", "Objective 2") and
+    _OBJ_TOO_SHORT for objectives under 6 words. Memoized: retries
+    frequently repeat the same wording.
+    """
+    s = obj.strip()
+    status = 0
+    if _PLACEHOLDER_PREFIX_RE.match(s):
+        status |= _OBJ_PLACEHOLDER
+    if s.count(' ') < 5:
+        status |= _OBJ_TOO_SHORT
+    return status
+
+
+class _JsonArrayScanner:
+    """Incremental scanner for top-level JSON arrays.
+    
+    Single left-to-right scan that tracks bracket depth and skips over string
+    literals (honouring backslash escapes), so it runs in linear time on any
+    input. Strings are only tracked inside brackets, so stray quotes in prose
+    do not affect the scan. Text can be fed in pieces (e.g. streamed tokens);
+    scan state is kept across calls so each character is visited once.
+    """
+
+    def __init__(self) -> None:
+        self.text = ''
+        self._pos = 0
+        self._stack = []    # Positions of currently open '['
+        self._orphans = []  # Complete arrays directly inside the outermost open '['
+        self._in_string = False
+
+    def feed(self, chunk: str) -> Iterator[Tuple[int, int]]:
+        """Append chunk and yield (start, end) spans of arrays it completes.
+        
+        Spans index into ``self.text``.
+        """
+        self.text += chunk
+        return self._scan()
+
+    def finish(self) -> Iterator[Tuple[int, int]]:
+        """Yield the complete arrays nested directly inside an unclosed outer
+        array (e.g. a truncated response), if the text ended inside one."""
+        if self._stack:
+            yield from self._orphans
+
+    def _scan(self) -> Iterator[Tuple[int, int]]:
+        text = self.text
+        stack = self._stack
+        i = self._pos
+        while True:
+            if self._in_string:
+                # Inside a string literal: find the closing unescaped quote
+                while True:
+                    i = text.find('"', i)
+                    if i == -1:
+                        self._pos = len(text)
+                        return
+                    backslashes = 0
+                    k = i - 1
+                    while text[k] == '\\':
+                        backslashes += 1
+                        k -= 1
+                    if backslashes % 2 == 0:
+                        break
+                    i += 1
+                self._in_string = False
+                i += 1
+                continue
+            
+            if not stack:
+                # Outside any array: jump straight to the next candidate
+                i = text.find('[', i)
+            else:
+                match = _ARRAY_TOKEN_RE.search(text, i)
+                i = match.start() if match else -1
+            if i == -1:
+                self._pos = len(text)
+                return
+            
+            char = text[i]
+            self._pos = i + 1
+            if char == '[':
+                stack.append(i)
+            elif char == ']':
+                start = stack.pop()
+                if not stack:
+                    self._orphans.clear()
+                    yield (start, i + 1)
+                elif len(stack) == 1:
+                    self._orphans.append((start, i + 1))
+            else:
+                # Opening quote inside an array
+                self._in_string = True
+            i += 1
+
+
+def _iter_json_array_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) spans of top-level JSON arrays in document order.
+    
+    If the text ends inside an unclosed array (e.g. a truncated response), the
+    complete arrays nested directly inside it are yielded instead.
+    
+    Args:
+        text: Text to scan
+        
+    Yields:
+        (start, end) index pairs such that text[start:end] is a bracketed span
+    """
+    scanner = _JsonArrayScanner()
+    yield from scanner.feed(text)
+    yield from scanner.finish()
+
+
+def _is_string_array_span(text: str, start: int, end: int) -> bool:
+    """Cheap structural check that text[start:end] could be a JSON array of strings.
+    
+    Rejects spans such as "[1]", "[]" or "[x]" (common in thinking traces)
+    without calling the JSON decoder.
+    """
+    if not _STRING_ARRAY_START_RE.match(text, start):
+        return False
+    j = end - 2
+    while j > start and text[j].isspace():
+        j -= 1
+    return text[j] == '"'
+
+
 def parse_json_array_safe(text: str, timeout_seconds: int = 10) -> Optional[List[str]]:
     """Safe wrapper for parse_json_array with timeout protection.
     
@@ -189,21 +417,35 @@ def parse_json_array(text: str) -> Optional[List[str]]:
     logger.debug(f"Parsing text (first 200 chars): {repr(text[:200])}")
     logger.debug(f"Parsing text (last 400 chars): {repr(text[-400:])}")
     
+    # Cheap substring prechecks let whole strategies be skipped when their
+    # markers cannot be present
+    text_lower = text.lower()
+    has_bracket = '[' in text
+    has_think = '/think' in text_lower
+    has_delimiter = (
+        '</think' in text_lower
+        or 'output the json array now:' in text_lower
+        or 'here is' in text_lower
+        or 'here are' in text_lower
+    )
+    
     # Quick strategy: Try to find complete JSON array first (most common case)
     # Look for pattern like ["...", "...", ...]
+    quick_bad_span = None
     try:
         # Simple regex for well-formed JSON array
-        simple_json_match = re.search(r'\[\s*"[^"]*"(?:\s*,\s*"[^"]*")*\s*\]', text, re.DOTALL)
+        simple_json_match = _SIMPLE_JSON_RE.search(text) if has_bracket else None
         if simple_json_match:
             json_str = simple_json_match.group(0)
             logger.debug(f"Quick match found JSON: {repr(json_str[:150])}")
             try:
-                parsed = json.loads(json_str)
+                parsed = _loads(json_str)
                 if isinstance(parsed, list) and len(parsed) > 0 and all(isinstance(x, str) for x in parsed):
                     # Check for placeholders immediately
-                    if any(obj.strip().lower().startswith(('lo', 'objective')) or len(obj.strip().split()) < 6 for obj in parsed):
+                    if any(_obj_status(obj) for obj in parsed):
                         logger.debug("Quick parse rejected: contains placeholders or too short")
-                        # Continue to other strategies
+                        quick_bad_span = simple_json_match.span()
+                        # Continue to other strategies unless this is the only candidate
                     else:
                         valid = validate_objectives(parsed)
                         if valid:
@@ -214,49 +456,55 @@ def parse_json_array(text: str) -> Optional[List[str]]:
     except Exception as e:
         logger.debug(f"Quick parse error: {e}, continuing with full parsing")
     
+    # Linear bracket scan (no regex backtracking on long or truncated output)
+    # Only spans shaped like ["...", ...] are worth decoding; the scan is
+    # cheap, so collect them once for Strategy 2
+    all_json_spans = [
+        span for span in (_iter_json_array_spans(text) if has_bracket else ())
+        if _is_string_array_span(text, *span)
+    ]
+    
+    # Clean JSON of bad content and nothing else to try: the remaining
+    # strategies would only re-extract and re-reject the same array
+    if quick_bad_span is not None and all_json_spans == [quick_bad_span]:
+        logger.debug("Only candidate array was rejected by quick parse, skipping other strategies")
+        return None
+    
     # Strategy 1: Handle /think token (for thinking models)
-    if '/think' in text.lower():
-        parts = re.split(r'/think', text, flags=re.IGNORECASE)
+    if has_think:
+        parts = _THINK_SPLIT_RE.split(text)
         if len(parts) > 1:
             answer_text = parts[-1].strip()
             logger.debug(f"Found /think token, extracted answer: {repr(answer_text[:300])}")
             try:
-                parsed = json.loads(answer_text)
+                parsed = _loads(answer_text)
                 if isinstance(parsed, list) and all(isinstance(x, str) for x in parsed):
                     # Check for placeholders
-                    if not any(obj.strip().lower().startswith(('lo', 'objective')) or len(obj.strip().split()) < 6 for obj in parsed):
+                    if not any(_obj_status(obj) for obj in parsed):
                         logger.debug(f"Successfully parsed JSON after /think: {len(parsed)} items")
                         return validate_objectives(parsed)
             except json.JSONDecodeError as e:
                 logger.debug(f"JSON parse error after /think: {e}")
-                json_match = re.search(r'(\[(?:[^[\]]*"[^"]*"[^[\]]*)*\])', answer_text, re.DOTALL)
-                if json_match:
+                json_span = next(_iter_json_array_spans(answer_text), None)
+                if json_span:
                     try:
-                        parsed = json.loads(json_match.group(1))
+                        parsed = _loads(answer_text[json_span[0]:json_span[1]])
                         if isinstance(parsed, list) and all(isinstance(x, str) for x in parsed):
-                            if not any(obj.strip().lower().startswith(('lo', 'objective')) or len(obj.strip().split()) < 6 for obj in parsed):
+                            if not any(_obj_status(obj) for obj in parsed):
                                 return validate_objectives(parsed)
                     except:
                         pass
     
     # Strategy 2: Look for JSON array anywhere in text
-    # Using a more efficient regex pattern to avoid backtracking issues
-    json_pattern = r'\[(?:[^[\]"]|"(?:[^"\\]|\\.)*")*\]'
-    try:
-        all_json_matches = list(re.finditer(json_pattern, text, re.DOTALL))
-    except Exception as e:
-        logger.warning(f"Regex matching timeout/error: {e}")
-        all_json_matches = []
-    
-    if all_json_matches:
-        for match in reversed(all_json_matches):  # Try from last to first
+    if all_json_spans:
+        for start, end in reversed(all_json_spans):  # Try from last to first
             try:
-                json_str = match.group(0)
+                json_str = text[start:end]
                 logger.debug(f"Trying JSON match: {repr(json_str[:150])}")
-                parsed = json.loads(json_str)
+                parsed = _loads(json_str)
                 if isinstance(parsed, list) and len(parsed) > 0 and all(isinstance(x, str) for x in parsed):
                     # Reject placeholders
-                    if any(obj.strip().lower().startswith(('lo', 'objective')) or len(obj.strip().split()) < 6 for obj in parsed):
+                    if any(_obj_status(obj) for obj in parsed):
                         logger.debug("JSON match rejected: contains placeholders or too short")
                         continue
                     logger.debug(f"Successfully parsed JSON array with {len(parsed)} items")
@@ -268,22 +516,21 @@ def parse_json_array(text: str) -> Optional[List[str]]:
                 continue
     
     # Strategy 3: Extract from numbered objective patterns
-    objective_patterns = [
-        r'\d+\.\s+([A-Z][^.]+\.?)',  # "1. Understand the concept..."
-        r'^\s*-\s+([A-Z][^.]+\.?)',  # "- Analyze the framework..."
-        r'Objective \d+[:\.]?\s+([A-Z][^.]+\.?)',  # "Objective 1: Explain..."
-    ]
-    
+    # finditer stops scanning once enough candidates are collected instead of
+    # materializing every match in long thinking traces
     extracted_objectives = []
-    for pattern in objective_patterns:
-        matches = re.findall(pattern, text, re.MULTILINE)
-        if matches:
-            logger.debug(f"Found {len(matches)} objectives using pattern: {pattern}")
+    for pattern in _OBJECTIVE_RES:
+        for match in pattern.finditer(text):
+            candidate = match.group(1)
             # Filter out placeholders
-            valid_matches = [m for m in matches if not m.strip().lower().startswith(('lo', 'objective')) and len(m.strip().split()) >= 6]
-            extracted_objectives.extend(valid_matches)
-            if len(extracted_objectives) >= 3:
+            if _obj_status(candidate):
+                continue
+            extracted_objectives.append(candidate)
+            if len(extracted_objectives) >= _MAX_PATTERN_OBJECTIVES:
                 break
+        if len(extracted_objectives) >= 3:
+            logger.debug(f"Found {len(extracted_objectives)} objectives using pattern: {pattern.pattern}")
+            break
     
     if extracted_objectives:
         valid = validate_objectives(extracted_objectives)
@@ -291,34 +538,26 @@ def parse_json_array(text: str) -> Optional[List[str]]:
             return valid
     
     # Strategy 4: Handle other thinking delimiters
-    thinking_patterns = [
-        r'</think>\s*(.*)',
-        r'<think>.*?</think>\s*(.*)',
-        r'<thinking>.*?</thinking>\s*(.*)',
-        r'Output the JSON array now:\s*(.*)',
-        r'(?:Here is|Here are) (?:the|my) .*?:\s*(.*)',
-    ]
-    
-    for pattern in thinking_patterns:
-        match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+    for pattern in (_THINKING_RES if has_delimiter else ()):
+        match = pattern.search(text)
         if match:
             extracted = match.group(1).strip()
             logger.debug(f"Extracted after pattern: {repr(extracted[:200])}")
             try:
-                parsed = json.loads(extracted)
+                parsed = _loads(extracted)
                 if isinstance(parsed, list) and all(isinstance(x, str) for x in parsed):
                     # Check for placeholders
-                    if not any(obj.strip().lower().startswith(('lo', 'objective')) or len(obj.strip().split()) < 6 for obj in parsed):
+                    if not any(_obj_status(obj) for obj in parsed):
                         valid = validate_objectives(parsed)
                         if valid:
                             return valid
             except:
-                json_in_extracted = re.search(json_pattern, extracted, re.DOTALL)
-                if json_in_extracted:
+                json_span = next(_iter_json_array_spans(extracted), None)
+                if json_span:
                     try:
-                        parsed = json.loads(json_in_extracted.group(0))
+                        parsed = _loads(extracted[json_span[0]:json_span[1]])
                         if isinstance(parsed, list) and all(isinstance(x, str) for x in parsed):
-                            if not any(obj.strip().lower().startswith(('lo', 'objective')) or len(obj.strip().split()) < 6 for obj in parsed):
+                            if not any(_obj_status(obj) for obj in parsed):
                                 valid = validate_objectives(parsed)
                                 if valid:
                                     return valid
@@ -330,6 +569,45 @@ def parse_json_array(text: str) -> Optional[List[str]]:
     return None
 
 
+@functools.lru_cache(maxsize=8192)
+def _validate_one(obj: str) -> Optional[str]:
+    """Validate a single objective, returning its cleaned form or None.
+    
+    Memoized: retries frequently produce the same objective wording again.
+    """
+    obj_clean = obj.strip().rstrip('.')
+    
+    # Check length, word count and verb from a single split
+    if len(obj_clean) < 20:
+        logger.debug(f"Filtered by length: {obj_clean} (length: {len(obj_clean)})")
+        return None
+    
+    words = obj_clean.split()
+    word_count = len(words)
+    if not (6 <= word_count <= 20):
+        logger.debug(f"Filtered by word count: {obj_clean} (words: {word_count})")
+        return None
+    
+    first_word = words[0].lower().rstrip(',:;')
+    if first_word not in _ACTION_VERBS:
+        logger.debug(f"Filtered by verb requirement: {obj_clean}")
+        return None
+    
+    # Check for placeholders
+    obj_lower = obj_clean.lower()
+    if _PLACEHOLDER_RE.search(obj_lower):
+        logger.debug(f"Rejected placeholder: {obj_clean}")
+        return None
+    
+    # Additional content quality check: too few unique words
+    if len(set(obj_lower.split())) < 4:
+        logger.debug(f"Filtered by content quality: {obj_clean}")
+        return None
+    
+    logger.debug(f"Valid objective: {obj_clean} (words: {word_count}, verb: {first_word})")
+    return obj_clean
+
+
 def validate_objectives(objectives: List[str]) -> List[str]:
     """Validate objectives based on schema requirements.
     
@@ -345,65 +623,277 @@ def validate_objectives(objectives: List[str]) -> List[str]:
     Returns:
         List of valid objectives or None if none are valid
     """
-    valid = []
-    action_verbs = [
-        # Learning-focused verbs
-        'understand', 'explain', 'describe', 'identify', 'recognize', 'recall',
-        'comprehend', 'interpret', 'summarize', 'classify', 'distinguish',
-        # Analysis verbs
-        'analyze', 'compare', 'contrast', 'examine', 'investigate', 'explore',
-        'evaluate', 'assess', 'critique', 'justify', 'determine', 'derive',
-        # Application verbs (theoretical application)
-        'apply', 'demonstrate', 'illustrate', 'relate', 'use', 'employ'
-    ]
+    valid = [obj for obj in map(_validate_one, objectives) if obj]
+    return valid if valid else None
+
+
+def _normalize_lo(lo: str) -> Optional[str]:
+    """Normalize a parsed objective before acceptance.
     
-    placeholder_patterns = [
-        'lo1', 'lo2', 'lo3', 'lo4', 'lo5', 'lo6',
-        'objective 1', 'objective 2', 'objective 3',
-        'learning objective', 'new objective', 'additional objective'
-    ]
+    Strips surrounding whitespace and dots, rejects objectives under 6 words
+    or starting like a placeholder ("LO1", "Objective", "Learning objective"),
+    and capitalizes the first letter.
+    
+    Returns:
+        Normalized objective, or None if it should be skipped
+    """
+    s = lo.strip(' \t\n\r.')
+    if s.count(' ') < 5:  # Stricter minimum
+        return None
+    if s.lower().startswith(_LO_PLACEHOLDER_PREFIXES):
+        return None
+    if not s[:1].isupper():
+        s = s[:1].upper() + s[1:]
+    return s
+
+
+class _SeenObjectives:
+    """Accepted objectives (lowercased) with an inverted word index.
+    
+    Exact duplicates are a set lookup. Near-duplicate checks count the words
+    a candidate shares with each accepted objective straight from the
+    word -> objective-ids posting lists, stopping at the first objective over
+    the threshold, instead of scanning every accepted objective.
+    """
+
+    def __init__(self):
+        self._exact = set()
+        self._count = 0
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __contains__(self, s_lower: str) -> bool:
+        return s_lower in self._exact
+
+    def add(self, s_lower: str) -> None:
+        self._exact.add(s_lower)
+        obj_id = self._count
+        self._count += 1
+        for word in set(s_lower.split()):
+            self._postings.setdefault(word, set()).add(obj_id)
+
+    def is_near_duplicate(self, s_lower: str, threshold: float) -> bool:
+        """True if more than `threshold` of the candidate's words appear in one accepted objective."""
+        words = s_lower.split()
+        if len(words) <= 4:
+            return False
+        cand_words = set(words)
+        # Overlap counts fall out of the posting lists directly, so no
+        # per-objective set intersections are built
+        min_shared = threshold * len(cand_words)
+        shared_counts: Dict[int, int] = {}
+        for word in cand_words:
+            for obj_id in self._postings.get(word, ()):
+                count = shared_counts.get(obj_id, 0) + 1
+                if count > min_shared:
+                    return True
+                shared_counts[obj_id] = count
+        return False
+
+
+# ============================================================================
+# Main Generation Function
+# ============================================================================
+
+async def _infer_objectives(prompt: str, max_tokens: int, temperature: float,
+                            stream: bool = True) -> Tuple[str, Optional[List[str]]]:
+    """Query the 4B model and parse learning objectives from its answer.
+    
+    When streaming, tokens are fed into an incremental array scanner and the
+    stream is closed as soon as a complete top-level array passes validation,
+    so the tokens the model would generate after the array are never waited
+    for. Otherwise (or if no array validates early) the full text goes through
+    parse_json_array_safe.
     
-    for obj in objectives:
-        obj_clean = obj.strip().rstrip('.')
-        word_count = len(obj_clean.split())
-        obj_lower = obj_clean.lower()
+    Args:
+        prompt: Prompt text
+        max_tokens: Maximum tokens to generate
+        temperature: Sampling temperature
+        stream: Use the streaming endpoint with early accept
         
-        # Check for placeholders
-        is_placeholder = any(placeholder in obj_lower for placeholder in placeholder_patterns)
-        if is_placeholder:
-            logger.debug(f"Rejected placeholder: {obj_clean}")
-            continue
+    Returns:
+        (response text, validated objectives or None)
+    """
+    if not stream:
+        result = await infer_4b_async(prompt, max_tokens=max_tokens, temperature=temperature)
+        resp = result.get('text', '') if result.get('ok') else ''
+        return resp, parse_json_array_safe(resp)
+    
+    scanner = _JsonArrayScanner()
+    token_stream = infer_4b_stream(prompt, max_tokens=max_tokens, temperature=temperature)
+    try:
+        async for token in token_stream:
+            for start, end in scanner.feed(token):
+                if not _is_string_array_span(scanner.text, start, end):
+                    continue
+                try:
+                    parsed = _loads(scanner.text[start:end])
+                except ValueError:
+                    continue
+                if (isinstance(parsed, list) and parsed and all(isinstance(x, str) for x in parsed)
+                        and not any(_obj_status(obj) for obj in parsed)):
+                    valid = validate_objectives(parsed)
+                    if valid:
+                        logger.debug(f"Accepted streamed array after {len(scanner.text)} chars")
+                        return scanner.text, valid
+    except Exception as e:
+        logger.warning(f"Streaming inference failed: {e}")
+    finally:
+        # Closing the generator closes the HTTP response
+        await token_stream.aclose()
+    
+    return scanner.text, parse_json_array_safe(scanner.text)
+
+
+async def _generate_los_for_module(cfg: DictConfig, module: str, chunks: List[Dict],
+                                   n_los: int) -> Dict:
+    """Generate learning objectives for a single module.
+    
+    The first main attempts are issued ``parallel_attempts`` at a time; as soon
+    as enough valid objectives have arrived the remaining requests are cancelled.
+    
+    Args:
+        cfg: Hydra configuration
+        module: Module title
+        chunks: Context chunks retrieved for the module
+        n_los: Number of learning objectives to generate
         
-        # Check word count and length
-        if not (6 <= word_count <= 20 and len(obj_clean) >= 20):
-            logger.debug(f"Filtered by length/word count: {obj_clean} (words: {word_count}, length: {len(obj_clean)})")
-            continue
+    Returns:
+        Dictionary with the module's learning objectives and metadata
+    """
+    logger.info(f"Processing module: {module}")
+
+    # Step 2: Keep retrying until we get valid objectives - no fallbacks
+    normalized = []
+    seen_objectives = _SeenObjectives()
+    resp = ''
+    max_main_attempts = 10
+    parallel_attempts = max(1, int(cfg.lo_gen.get('parallel_attempts', 2)))
+    stream = bool(cfg.lo_gen.get('stream_parse', True))
+    main_attempt = 0
+    
+    # Context slices are fixed for the module, so cut them once
+    context_text = chunks[0].get('text', '')[:800] if chunks else ''
+    context_samples = [chunk.get('text', '')[:600] for chunk in chunks]
+    
+    # Create a more explicit prompt that discourages placeholder responses
+    enhanced_prompt = _MAIN_PROMPT.format(n_los=n_los, module=module, context=context_text)
+    
+    logger.info(f"Calling VLLM 4B model at {VLLM_4B_URL} with model {VLLM_4B_MODEL}")
+    while len(normalized) < n_los and main_attempt < max_main_attempts:
+        round_size = min(parallel_attempts, max_main_attempts - main_attempt)
+        main_attempt += round_size
+        logger.info(f"Main attempts {main_attempt - round_size + 1}-{main_attempt} for module: {module}")
+        tasks = [
+            asyncio.ensure_future(_infer_objectives(enhanced_prompt, max_tokens=800,
+                                                    temperature=0.2, stream=stream))
+            for _ in range(round_size)
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                # Response is parsed as it streams - only valid objectives are returned
+                resp, parsed = await next_result
+                logger.debug(f"Response length: {len(resp)} chars")
+                
+                if parsed:
+                    # Process valid objectives
+                    for lo in parsed:
+                        if len(normalized) >= n_los:
+                            break
+                        
+                        s = _normalize_lo(lo)
+                        if s is None:
+                            continue
+                        
+                        # Check for duplicates
+                        s_lower = s.lower()
+                        is_duplicate = s_lower == module.lower() or s_lower in seen_objectives
+                        
+                        if not is_duplicate:
+                            normalized.append(s)
+                            seen_objectives.add(s_lower)
+                            logger.info(f"Added valid objective: {s}")
+
+                if len(normalized) >= n_los:
+                    break
+        finally:
+            # Drop in-flight attempts that are no longer needed
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Step 3: Generate additional objectives if still needed
+    additional_attempts = 0
+    max_additional_attempts = 15
+    
+    while len(normalized) < n_los and additional_attempts < max_additional_attempts:
+        additional_attempts += 1
+        remaining = n_los - len(normalized)
         
-        # Check if starts with action verb
-        starts_with_verb = any(obj_lower.startswith(verb) for verb in action_verbs)
-        if not starts_with_verb:
-            logger.debug(f"Filtered by verb requirement: {obj_clean}")
-            continue
+        # Vary focus and context for diversity
+        focus = _FOCUS_AREAS[min(additional_attempts - 1, len(_FOCUS_AREAS) - 1)]
         
-        # Additional content quality checks
-        if (obj_clean.count(' ') < 5 or  # Too few spaces
-            len(set(obj_clean.lower().split())) < 4):  # Too few unique words
-            logger.debug(f"Filtered by content quality: {obj_clean}")
-            continue
+        context_sample = context_samples[min(additional_attempts-1, len(chunks)-1)] if chunks else ""
+        covered_topics = [obj.split()[:4] for obj in normalized] if normalized else []
+        
+        additional_prompt = _ADDITIONAL_PROMPT.format(
+            remaining=remaining, module=module, focus=focus,
+            context=context_sample, covered_topics=covered_topics
+        )
+        
+        logger.info(f"Additional attempt {additional_attempts}, need {remaining} more objectives")
+        _, additional_parsed = await _infer_objectives(additional_prompt, max_tokens=600,
+                                                       temperature=0.3, stream=stream)
+        additional_parsed = additional_parsed or []
+        
+        added_count = 0
+        for additional_lo in additional_parsed:
+            if len(normalized) >= n_los:
+                break
+            
+            s = _normalize_lo(additional_lo)
+            if s is None:
+                continue
+            
+            # Check for duplicates with similarity threshold
+            s_lower = s.lower()
+            is_duplicate = (s_lower in seen_objectives or
+                            seen_objectives.is_near_duplicate(s_lower, threshold=0.6))  # More lenient for diversity
+            
+            if not is_duplicate:
+                normalized.append(s)
+                seen_objectives.add(s_lower)
+                added_count += 1
+                logger.info(f"Added additional objective: {s}")
+        
+        if added_count == 0:
+            logger.warning(f"No valid objectives added in attempt {additional_attempts}")
         
-        valid.append(obj_clean)
-        logger.debug(f"Valid objective: {obj_clean} (words: {word_count}, verb: {starts_with_verb})")
+        # If we're not making progress, break to avoid infinite loop
+        if additional_attempts > 5 and added_count == 0:
+            break
     
-    return valid if valid else None
+    # Display generated objectives
+    print(f"\n🎯 Learning Objectives for '{module}':")
+    print("=" * (len(module) + 30))
+    for i, objective in enumerate(normalized[:n_los], 1):
+        print(f"{i}. {objective}")
+    print(f"\n✅ Generated {len(normalized[:n_los])} objectives\n")
+    logger.info(f"[{module}] -> {len(normalized[:n_los])} LOs")
 
+    return {
+        "learning_objectives": normalized[:n_los],
+        "raw_model_output": resp,
+        "context_chunks": chunks
+    }
 
-# ============================================================================
-# Main Generation Function
-# ============================================================================
 
-def generate_los_for_modules(cfg: DictConfig, modules: List[str], top_k: int = None, 
-                             n_los: int = None, save_path: Optional[Path] = None) -> Dict[str, Dict]:
-    """Generate learning objectives for multiple modules.
+async def generate_los_for_modules_async(cfg: DictConfig, modules: List[str], top_k: int = None,
+                                         n_los: int = None, save_path: Optional[Path] = None) -> Dict[str, Dict]:
+    """Generate learning objectives for multiple modules concurrently.
+    
+    Modules are processed in parallel, bounded by ``cfg.lo_gen.max_concurrency``;
+    vLLM batches the in-flight requests on the server side.
     
     Args:
         cfg: Hydra configuration
@@ -424,183 +914,27 @@ def generate_los_for_modules(cfg: DictConfig, modules: List[str], top_k: int = N
     # Load LangChain vector store
     vector_store = load_vector_store(cfg)
 
-    results = {}
-    for module in modules:
-        logger.info(f"Processing module: {module}")
-        
-        # Step 1: Retrieve context chunks
-        chunks = []
-        if vector_store is not None:
-            chunks = retrieve_chunks_from_vector_store(vector_store, module, top_k=top_k)
-        
-        if not chunks:
+    # Step 1: Retrieve context chunks for all modules in one batched search
+    module_chunks = [[] for _ in modules]
+    if vector_store is not None:
+        module_chunks = retrieve_chunks_batch(vector_store, modules, top_k=top_k)
+
+    for i, module in enumerate(modules):
+        if not module_chunks[i]:
             logger.warning(f"No vector store chunks found for {module}, using keyword search")
-            chunks = keyword_search(cfg, module, max_docs=top_k)
+            module_chunks[i] = keyword_search(cfg, module, max_docs=top_k)
 
-        # Step 2: Keep retrying until we get valid objectives - no fallbacks
-        normalized = []
-        seen_objectives = set()
-        max_main_attempts = 10
-        main_attempt = 0
-        
-        while len(normalized) < n_los and main_attempt < max_main_attempts:
-            main_attempt += 1
-            context_text = chunks[0].get('text', '')[:800] if chunks else ''
-            
-            # Create a more explicit prompt that discourages placeholder responses
-            enhanced_prompt = (
-                f"Generate exactly {n_los} complete learning objectives for the module: {module}\n\n"
-                f"Context: {context_text}\n\n"
-                f"CRITICAL REQUIREMENTS:\n"
-                f"- Each objective must be 8-18 words long\n"
-                f"- Start with action verbs: Understand, Explain, Analyze, Compare, Evaluate, Describe, Apply\n"
-                f"- Must be actual learning objectives, NOT placeholders like 'LO1', 'LO2'\n"
-                f"- Focus on theoretical and conceptual understanding\n"
-                f"- Output ONLY a JSON array of strings\n\n"
-                f"Example format: [\"Understand the fundamental principles of quantum mechanics in field theory\", \"Analyze the mathematical foundations of relativistic quantum field equations\"]\n\n"
-                f"Generate {n_los} actual learning objectives now:"
-            )
-            from dotenv import load_dotenv
-            load_dotenv()
-            VLLM_4B_URL = os.getenv('VLLM_4B_URL', 'http://localhost:8001/v1').rstrip('/')
-            VLLM_4B_MODEL = os.getenv('VLLM_4B_MODEL', './Qwen3-4B-Thinking-2507-Q4_K_M.gguf')
-            logger.info(f"Calling VLLM 4B model at {VLLM_4B_URL} with model {VLLM_4B_MODEL}")
-            logger.info(f"Main attempt {main_attempt} for module: {module}")
-            result = infer_4b(enhanced_prompt, max_tokens=800, temperature=0.2)
-            resp = result.get('text', '') if result.get('ok') else ''
-            logger.debug(f"Response length: {len(resp)} chars")
-
-            # Parse response - only accept valid objectives
-            parsed = parse_json_array_safe(resp)
-            
-            if parsed:
-                # Process valid objectives
-                for lo in parsed:
-                    if len(normalized) >= n_los:
-                        break
-                    
-                    s = lo.strip().rstrip(".")
-                    if not s or len(s.split()) < 6:  # Stricter minimum
-                        continue
-                    
-                    # Skip obvious placeholders
-                    if s.lower().startswith(('lo', 'objective', 'learning objective')):
-                        continue
-                    
-                    # Ensure starts with capital letter
-                    if not s[0].isupper():
-                        s = s[0].upper() + s[1:]
-                    
-                    # Check for duplicates
-                    s_lower = s.lower()
-                    is_duplicate = (s_lower == module.lower() or 
-                                  any(s_lower == seen.lower() for seen in seen_objectives))
-                    
-                    if not is_duplicate:
-                        normalized.append(s)
-                        seen_objectives.add(s)
-                        logger.info(f"Added valid objective: {s}")
-        
-        # Step 3: Generate additional objectives if still needed
-        additional_attempts = 0
-        max_additional_attempts = 15
-        
-        while len(normalized) < n_los and additional_attempts < max_additional_attempts:
-            additional_attempts += 1
-            remaining = n_los - len(normalized)
-            
-            # Vary focus and context for diversity
-            focus_areas = [
-                "theoretical foundations and principles",
-                "mathematical analysis and derivations", 
-                "conceptual understanding and interpretation",
-                "comparison and evaluation of different approaches",
-                "application of theories and methods"
-            ]
-            focus = focus_areas[min(additional_attempts - 1, len(focus_areas) - 1)]
-            
-            context_sample = chunks[min(additional_attempts-1, len(chunks)-1)].get('text', '')[:600] if chunks else ""
-            covered_topics = [obj.split()[:4] for obj in normalized] if normalized else []
-            
-            additional_prompt = (
-                f"Generate {remaining} MORE learning objectives for: {module}\n\n"
-                f"Focus area: {focus}\n"
-                f"Context: {context_sample}\n\n"
-                f"AVOID these already covered topics: {covered_topics}\n\n"
-                f"Requirements:\n"
-                f"- Each objective: 8-18 words\n"
-                f"- Start with: Understand, Explain, Analyze, Compare, Evaluate, Describe, Apply, Derive\n"
-                f"- NO placeholders (LO1, LO2, etc.)\n"
-                f"- Must be different from existing objectives\n"
-                f"- Focus on {focus}\n\n"
-                f"Output exactly {remaining} objectives as JSON array:"
-            )
-            
-            logger.info(f"Additional attempt {additional_attempts}, need {remaining} more objectives")
-            additional_result = infer_4b(additional_prompt, max_tokens=600, temperature=0.3)
-            additional_resp = additional_result.get('text', '') if additional_result.get('ok') else ''
-            additional_parsed = parse_json_array_safe(additional_resp) or []
-            
-            added_count = 0
-            for additional_lo in additional_parsed:
-                if len(normalized) >= n_los:
-                    break
-                
-                s = additional_lo.strip().rstrip(".")
-                if not s or len(s.split()) < 6:  # Stricter minimum
-                    continue
-                    
-                # Skip placeholders
-                if s.lower().startswith(('lo', 'objective', 'learning objective')):
-                    continue
-                    
-                if not s[0].isupper():
-                    s = s[0].upper() + s[1:]
-                
-                # Check for duplicates with similarity threshold
-                s_lower = s.lower()
-                is_duplicate = False
-                
-                for seen in seen_objectives:
-                    if s_lower == seen.lower():
-                        is_duplicate = True
-                        break
-                    # Check word overlap for near-duplicates
-                    if len(s_lower.split()) > 4:
-                        s_words = set(s_lower.split())
-                        seen_words = set(seen.lower().split())
-                        overlap_ratio = len(s_words & seen_words) / len(s_words)
-                        if overlap_ratio > 0.6:  # More lenient for diversity
-                            is_duplicate = True
-                            break
-                
-                if not is_duplicate:
-                    normalized.append(s)
-                    seen_objectives.add(s)
-                    added_count += 1
-                    logger.info(f"Added additional objective: {s}")
-            
-            if added_count == 0:
-                logger.warning(f"No valid objectives added in attempt {additional_attempts}")
-            
-            # If we're not making progress, break to avoid infinite loop
-            if additional_attempts > 5 and added_count == 0:
-                break
-        
-        # Step 6: Store results
-        results[module] = {
-            "learning_objectives": normalized[:n_los],
-            "raw_model_output": resp,
-            "context_chunks": chunks
-        }
-        
-        # Display generated objectives
-        print(f"\n🎯 Learning Objectives for '{module}':")
-        print("=" * (len(module) + 30))
-        for i, objective in enumerate(normalized[:n_los], 1):
-            print(f"{i}. {objective}")
-        print(f"\n✅ Generated {len(normalized[:n_los])} objectives\n")
-        logger.info(f"[{module}] -> {len(normalized[:n_los])} LOs")
+    semaphore = asyncio.Semaphore(max(1, int(cfg.lo_gen.get('max_concurrency', 4))))
+
+    async def process_module(module: str, chunks: List[Dict]) -> Dict:
+        async with semaphore:
+            return await _generate_los_for_module(cfg, module, chunks, n_los)
+
+    # Step 6: Store results (gather preserves module order)
+    module_results = await asyncio.gather(
+        *[process_module(module, chunks) for module, chunks in zip(modules, module_chunks)]
+    )
+    results = dict(zip(modules, module_results))
 
     # Save results to file
     if save_path is None:
@@ -609,13 +943,38 @@ def generate_los_for_modules(cfg: DictConfig, modules: List[str], top_k: int = N
         save_dir.mkdir(parents=True, exist_ok=True)
         save_path = save_dir / "los.json"
     
-    with open(save_path, "w") as f:
-        json.dump(results, f, indent=2)
+    if ORJSON_AVAILABLE:
+        with open(save_path, "wb") as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(save_path, "w") as f:
+            json.dump(results, f, indent=2)
     logger.info(f"Saved results to {save_path}")
     
     return results
 
 
+def generate_los_for_modules(cfg: DictConfig, modules: List[str], top_k: int = None, 
+                             n_los: int = None, save_path: Optional[Path] = None) -> Dict[str, Dict]:
+    """Generate learning objectives for multiple modules.
+    
+    Synchronous entry point; runs generate_los_for_modules_async on a fresh
+    event loop.
+    
+    Args:
+        cfg: Hydra configuration
+        modules: List of module titles
+        top_k: Number of context chunks to retrieve
+        n_los: Number of learning objectives per module
+        save_path: Optional path to save results
+        
+    Returns:
+        Dictionary mapping module names to their learning objectives and metadata
+    """
+    return run_async(generate_los_for_modules_async(cfg, modules, top_k=top_k,
+                                                    n_los=n_los, save_path=save_path))
+
+
 # ============================================================================
 # Main Entry Point
 # ============================================================================
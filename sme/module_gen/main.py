@@ -6,6 +6,8 @@ Generates structured learning content for educational modules using:
 - User preferences
 - Vector store retrieval for relevant context
 """
+import asyncio
+import hashlib
 import json
 import os
 import re
@@ -13,11 +15,23 @@ import time
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 
+import numpy as np
 import hydra
 from omegaconf import DictConfig
 from loguru import logger
 
-from vllm_client import infer_4b
+from vllm_client import VLLM_4B_MODEL, infer_4b_async, infer_4b_batch_async, run_async
+from llm_cache import SemanticCache, get_semantic_cache
+
+# orjson encodes and decodes several times faster than the stdlib; its
+# JSONDecodeError subclasses json.JSONDecodeError, so handlers work for both
+try:
+    import orjson
+    _loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _loads = json.loads
+    ORJSON_AVAILABLE = False
 
 try:
     from langchain_community.vectorstores import FAISS
@@ -27,15 +41,61 @@ except ImportError:
     LANGCHAIN_AVAILABLE = False
     logger.error("LangChain components not available. Please install required packages.")
 
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
 # Configuration
 os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
 PROJECT_ROOT = Path(__file__).parent.parent
 
+# Precompiled patterns for response cleanup and section parsing. The section
+# pattern runs over the whole generated module, so use RE2's linear-time
+# matcher when it is installed
+_THINK_RE = re.compile(r'</think>', re.IGNORECASE)
+_SECTION_PATTERN = r'(?m)^#{1,3}\s+(.+?)$|^([A-Z][^a-z\n]{5,})$'
+_SECTION_RE = re.compile(_SECTION_PATTERN)
+if RE2_AVAILABLE:
+    try:
+        _SECTION_RE = re2.compile(_SECTION_PATTERN)
+    except Exception as e:
+        logger.debug(f"RE2 rejected section pattern ({e}), using re")
+
 
 # ============================================================================
 # Vector Store Functions
 # ============================================================================
 
+def resolve_embedding_device(device: Optional[str]) -> str:
+    """Resolve the configured embedding device.
+    
+    "auto" picks CUDA when available; a CUDA device falls back to CPU when
+    torch or a GPU is missing.
+    """
+    device = str(device or "cpu")
+    if device != "auto" and not device.startswith("cuda"):
+        return device
+    try:
+        import torch
+        cuda_available = torch.cuda.is_available()
+    except ImportError:
+        cuda_available = False
+    if not cuda_available:
+        if device != "auto":
+            logger.warning(f"Embedding device {device} requested but CUDA is unavailable, using cpu")
+        return "cpu"
+    return "cuda" if device == "auto" else device
+
+
+def _vector_store_dir(cfg: DictConfig) -> Path:
+    """Return the vector store directory, course-specific if course_id is set."""
+    vs_path = PROJECT_ROOT / cfg.rag.vector_store_path
+    course_id = cfg.module_gen.get('course_id', None)
+    return vs_path / str(course_id) if course_id else vs_path
+
+
 def load_vector_store(cfg: DictConfig):
     """Load LangChain FAISS vector store.
     
@@ -51,21 +111,23 @@ def load_vector_store(cfg: DictConfig):
     if not LANGCHAIN_AVAILABLE:
         raise Exception("LangChain not available. Install required packages.")
     
-    vs_path = PROJECT_ROOT / cfg.rag.vector_store_path
-    
-    # If course_id is provided in module_gen config, use course-specific vector store path
-    course_id = cfg.module_gen.get('course_id', None)
-    if course_id:
-        vs_path = vs_path / course_id
-        logger.info(f"Using course-specific vector store path: {vs_path}")
+    vs_path = _vector_store_dir(cfg)
+    logger.info(f"Using vector store path: {vs_path}")
     
     if not vs_path.exists():
         raise FileNotFoundError(f"Vector store not found: {vs_path}")
         
+    device = resolve_embedding_device(cfg.rag.get('embedding_device', 'cpu'))
+    model_kwargs = {"device": device}
+    if device.startswith("cuda"):
+        # fp16 weights halve the matmul cost on GPU
+        model_kwargs["model_kwargs"] = {"torch_dtype": "float16"}
     embeddings = HuggingFaceEmbeddings(
         model_name=cfg.rag.embedding_model_name, 
-        model_kwargs={"device": "cpu"}
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
     )
+    logger.info(f"Embedding model on device: {device}")
     vector_store = FAISS.load_local(
         str(vs_path), 
         embeddings, 
@@ -75,105 +137,200 @@ def load_vector_store(cfg: DictConfig):
     return vector_store
 
 
+def _doc_to_chunk(doc, i: int) -> Dict:
+    """Convert a retrieved LangChain document into a context chunk."""
+    return {
+        "text": doc.page_content[:1500],
+        "source": doc.metadata.get("filename", doc.metadata.get("source", f"doc-{i}")),
+        "metadata": doc.metadata
+    }
+
+
 def retrieve_context_for_objectives(vector_store, module_name: str, 
-                                    objectives: List[str], top_k: int) -> Dict[str, List[Dict]]:
+                                    objectives: List[str], top_k: int,
+                                    query_vectors: Optional[List[List[float]]] = None) -> Dict[str, List[Dict]]:
     """Retrieve relevant context for each learning objective.
     
+    All objective queries are embedded in one batch and searched with a single
+    FAISS call; falls back to one retriever call per objective if that fails.
+    
     Args:
         vector_store: FAISS vector store instance
         module_name: Name of the module
         objectives: List of learning objectives
         top_k: Number of chunks to retrieve per objective
+        query_vectors: Optional precomputed embeddings of the
+            "<module_name>: <objective>" queries, in objective order
         
     Returns:
         Dictionary mapping each objective to its retrieved context chunks
     """
     context_map = {}
+    if not objectives:
+        return context_map
+    
+    try:
+        if query_vectors is None:
+            query_vectors = vector_store.embeddings.embed_documents(
+                [f"{module_name}: {obj}" for obj in objectives]
+            )
+        vectors = np.asarray(query_vectors, dtype=np.float32)
+        if getattr(vector_store, "_normalize_L2", False):
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        _, indices = vector_store.index.search(vectors, top_k)
+        
+        for obj, row in zip(objectives, indices):
+            docs = [
+                vector_store.docstore.search(vector_store.index_to_docstore_id[int(idx)])
+                for idx in row if idx != -1
+            ]
+            context_map[obj] = [_doc_to_chunk(doc, i) for i, doc in enumerate(docs)]
+            logger.debug(f"Retrieved {len(context_map[obj])} chunks for: {obj[:60]}...")
+        return context_map
+    except Exception as e:
+        logger.warning(f"Batched retrieval failed ({e}), retrieving per objective")
+        context_map = {}
     
+    retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
     for obj in objectives:
-        query = f"{module_name}: {obj}"
-        retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
-        docs = retriever.invoke(query)
+        docs = retriever.invoke(f"{module_name}: {obj}")
         
-        chunks = []
-        for i, doc in enumerate(docs):
-            chunks.append({
-                "text": doc.page_content[:1500],
-                "source": doc.metadata.get("filename", doc.metadata.get("source", f"doc-{i}")),
-                "metadata": doc.metadata
-            })
-        context_map[obj] = chunks
-        logger.debug(f"Retrieved {len(chunks)} chunks for: {obj[:60]}...")
+        context_map[obj] = [_doc_to_chunk(doc, i) for i, doc in enumerate(docs)]
+        logger.debug(f"Retrieved {len(context_map[obj])} chunks for: {obj[:60]}...")
     
     return context_map
 
 
-def summarize_chunks_for_objective(cfg: DictConfig, objective: str, 
-                                  chunks: List[Dict], module_name: str) -> str:
-    """Summarize retrieved chunks for a single learning objective.
+def _join_bounded(texts: List[str], sep: str, limit: int) -> str:
+    """Return sep.join(texts)[:limit], joining only the texts that fit."""
+    parts = []
+    total = 0
+    for text in texts:
+        if parts:
+            total += len(sep)
+        parts.append(text)
+        total += len(text)
+        if total >= limit:
+            break
+    return sep.join(parts)[:limit]
+
+
+def _build_summary_prompt(prompt_template: str, objective: str, chunks: List[Dict]) -> str:
+    """Build the summarization prompt for a single learning objective.
     
     Args:
-        cfg: Hydra configuration
+        prompt_template: Summarization prompt template
         objective: The learning objective
         chunks: List of retrieved context chunks
-        module_name: Name of the module
         
     Returns:
-        Summarized context for the objective
+        Prompt text
     """
     if not chunks:
         raise ValueError(f"No context available for: {objective}")
     
-    # Combine chunks
-    combined_text = "\n\n".join([chunk["text"] for chunk in chunks])
+    # Combine chunks, stopping once the context budget is filled
+    combined_text = _join_bounded([chunk["text"] for chunk in chunks], "\n\n", 2000)
     
     # Use configured prompt template
-    prompt = cfg.module_gen.summarization_prompt_template.format(
+    return prompt_template.format(
         objective=objective,
-        context=combined_text[:2000]
+        context=combined_text
     )
+
+
+def _clean_summary(objective: str, text: str) -> str:
+    """Strip thinking tokens from a summary response and echo it to the terminal.
+    
+    Args:
+        objective: The learning objective
+        text: Raw model response
+        
+    Returns:
+        Cleaned summary
+    """
+    summary = text.strip()
+    original_length = len(summary)
+    
+    # Extract content after </think> delimiter
+    if '</think>' in summary.lower():
+        parts = _THINK_RE.split(summary)
+        extracted = parts[-1].strip()
+        
+        # Only use extracted part if it's substantial (more than 50 chars)
+        # Otherwise, the model might have cut off mid-generation
+        if len(extracted) > 50:
+            summary = extracted
+            logger.debug(f"Removed thinking tokens using </think> tag")
+        else:
+            logger.warning(f"Extracted summary too short ({len(extracted)} chars), using full response")
+            # Keep the full response without think tag splitting
+    
+    # Print summary to terminal
+    obj_preview = objective[:60] + "..." if len(objective) > 60 else objective
+    print(f"\n📝 Summary for LO: {obj_preview}")
+    print(f"{summary}\n")
+    print("-" * 80)
+    
+    logger.debug(f"Summarized -> {len(summary)} chars (original: {original_length})")
+    return summary
+
+
+async def summarize_chunks_for_objective(objective: str, chunks: List[Dict], module_name: str,
+                                        prompt_template: str, max_tokens: int,
+                                        temperature: float) -> str:
+    """Summarize retrieved chunks for a single learning objective.
+    
+    Args:
+        objective: The learning objective
+        chunks: List of retrieved context chunks
+        module_name: Name of the module
+        prompt_template: Summarization prompt template
+        max_tokens: Maximum tokens per summary
+        temperature: Sampling temperature
+        
+    Returns:
+        Summarized context for the objective
+    """
+    prompt = _build_summary_prompt(prompt_template, objective, chunks)
     
     try:
-        result = infer_4b(
-            prompt, 
-            max_tokens=cfg.module_gen.summarization_max_tokens,
-            temperature=cfg.module_gen.summarization_temperature
-        )
+        result = await infer_4b_async(prompt, max_tokens=max_tokens, temperature=temperature)
         if not result.get('ok'):
             logger.error(f"Summarization failed: {result.get('error', 'Unknown error')}")
             raise Exception("LLM call failed")
         
-        summary = result.get('text', '').strip()
-        original_length = len(summary)
-        
-        # Extract content after </think> delimiter
-        if '</think>' in summary.lower():
-            parts = re.split(r'</think>', summary, flags=re.IGNORECASE)
-            extracted = parts[-1].strip()
-            
-            # Only use extracted part if it's substantial (more than 50 chars)
-            # Otherwise, the model might have cut off mid-generation
-            if len(extracted) > 50:
-                summary = extracted
-                logger.debug(f"Removed thinking tokens using </think> tag")
-            else:
-                logger.warning(f"Extracted summary too short ({len(extracted)} chars), using full response")
-                # Keep the full response without think tag splitting
-        
-        # Print summary to terminal
-        obj_preview = objective[:60] + "..." if len(objective) > 60 else objective
-        print(f"\n📝 Summary for LO: {obj_preview}")
-        print(f"{summary}\n")
-        print("-" * 80)
-        
-        logger.debug(f"Summarized {len(combined_text)} chars -> {len(summary)} chars (original: {original_length})")
-        return summary
+        return _clean_summary(objective, result.get('text', ''))
         
     except Exception as e:
         logger.error(f"Error during summarization: {e}")
         raise
 
 
+async def summarize_objectives_batched(context_map: Dict[str, List[Dict]], prompt_template: str,
+                                       max_tokens: int, temperature: float) -> Optional[List[str]]:
+    """Summarize all learning objectives with a single batched completions request.
+    
+    Args:
+        context_map: Dictionary mapping each objective to its context chunks
+        prompt_template: Summarization prompt template
+        max_tokens: Maximum tokens per summary
+        temperature: Sampling temperature
+        
+    Returns:
+        Summaries in context_map order, or None if the batched request failed
+    """
+    prompts = [_build_summary_prompt(prompt_template, obj, chunks) for obj, chunks in context_map.items()]
+    results = await infer_4b_batch_async(prompts, max_tokens=max_tokens, temperature=temperature)
+    
+    failed = [res for res in results if not res.get('ok')]
+    if failed:
+        logger.warning(f"Batched summarization failed ({failed[0].get('error', 'Unknown error')})")
+        return None
+    
+    return [_clean_summary(obj, res.get('text', '')) for obj, res in zip(context_map, results)]
+
+
 # ============================================================================
 # Content Parsing Functions
 # ============================================================================
@@ -199,6 +356,11 @@ def parse_module_content(text: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _join_section(parts: List[str]) -> str:
+    """Join section paragraphs, each followed by a blank line."""
+    return "\n\n".join(parts) + "\n\n" if parts else ""
+
+
 def _parse_content(text: str) -> Dict[str, Any]:
     """Internal function to parse module content.
     
@@ -217,10 +379,11 @@ def _parse_content(text: str) -> Dict[str, Any]:
     }
     
     # Split by common section markers
-    section_pattern = r'^#{1,3}\s+(.+?)$|^([A-Z][^a-z\n]{5,})$'
-    sections = re.split(section_pattern, text, flags=re.MULTILINE)
+    sections = _SECTION_RE.split(text)
     
+    # Section bodies are collected as lists and joined once when the section closes
     current_section = None
+    current_parts = []
     for part in sections:
         if not part:
             continue
@@ -231,13 +394,15 @@ def _parse_content(text: str) -> Dict[str, Any]:
         # Check if it's a header
         if len(part) < 100 and (part[0] == '#' or part.isupper()):
             if current_section:
+                current_section["content"] = _join_section(current_parts)
                 content["sections"].append(current_section)
             current_section = {
                 "title": part.lstrip('#').strip(),
                 "content": ""
             }
+            current_parts = []
         elif current_section:
-            current_section["content"] += part + "\n\n"
+            current_parts.append(part)
         else:
             # Content before first section
             if not content["sections"]:
@@ -247,7 +412,8 @@ def _parse_content(text: str) -> Dict[str, Any]:
                 })
     
     # Add last section
-    if current_section and current_section["content"]:
+    if current_section and current_parts:
+        current_section["content"] = _join_section(current_parts)
         content["sections"].append(current_section)
     
     return content
@@ -309,12 +475,44 @@ def format_user_preferences(cfg: DictConfig, preferences: Dict[str, Any]) -> str
 # Main Content Generation Function
 # ============================================================================
 
-def generate_module_content(cfg: DictConfig, module_name: str, 
-                           learning_objectives: List[str],
-                           user_preferences: Dict[str, Any],
-                           top_k_per_objective: Optional[int] = None) -> Dict[str, Any]:
+def _get_summary_cache(cfg: DictConfig) -> Optional[SemanticCache]:
+    """Return the course's semantic summary cache, or None if disabled.
+    
+    Summaries depend on the course's vector store, the summarization prompt
+    and the models, so the cache lives under a course directory and a
+    version key derived from all of them. Rebuilding the store or changing
+    the prompt or a model starts a fresh cache.
+    """
+    cache_cfg = cfg.get('llm_cache', None)
+    if not cache_cfg or not cache_cfg.get('semantic_enabled', False):
+        return None
+    
+    index_file = _vector_store_dir(cfg) / 'index.faiss'
+    index_mtime = index_file.stat().st_mtime_ns if index_file.exists() else 0
+    version = hashlib.sha256('\0'.join([
+        str(index_mtime),
+        cfg.module_gen.summarization_prompt_template,
+        VLLM_4B_MODEL,
+        cfg.rag.embedding_model_name,
+    ]).encode('utf-8')).hexdigest()[:16]
+    
+    scope = cfg.module_gen.get('course_id', None) or 'default'
+    cache = get_semantic_cache(
+        PROJECT_ROOT / cache_cfg.semantic_cache_dir / scope / version,
+        threshold=cache_cfg.get('semantic_threshold', 0.92)
+    )
+    return cache if cache.enabled else None
+
+
+async def generate_module_content_async(cfg: DictConfig, module_name: str, 
+                                       learning_objectives: List[str],
+                                       user_preferences: Dict[str, Any],
+                                       top_k_per_objective: Optional[int] = None) -> Dict[str, Any]:
     """Generate structured module content based on learning objectives and user preferences.
     
+    Per-objective summaries are requested concurrently, bounded by
+    ``cfg.module_gen.max_parallel_summaries``.
+    
     Args:
         cfg: Hydra configuration
         module_name: Name of the module
@@ -328,9 +526,15 @@ def generate_module_content(cfg: DictConfig, module_name: str,
     Raises:
         Exception if generation fails
     """
+    # Read config once; DictConfig attribute access is slow inside loops
+    mg = cfg.module_gen
+    sum_prompt = mg.summarization_prompt_template
+    sum_max_tokens = mg.summarization_max_tokens
+    sum_temperature = mg.summarization_temperature
+    
     # Use config default if not provided
     if top_k_per_objective is None:
-        top_k_per_objective = cfg.module_gen.default_top_k_per_objective
+        top_k_per_objective = mg.default_top_k_per_objective
     
     logger.info(f"Generating content for module: {module_name}")
     logger.info(f"Learning objectives: {len(learning_objectives)}")
@@ -341,22 +545,78 @@ def generate_module_content(cfg: DictConfig, module_name: str,
     
     # Retrieve context for each objective
     logger.info("Retrieving context from vector store...")
+    # Objective queries are embedded once, for retrieval and the semantic cache
+    queries = [f"{module_name}: {obj}" for obj in learning_objectives]
+    try:
+        query_vectors = vector_store.embeddings.embed_documents(queries)
+    except Exception as e:
+        # Retrieval falls back to per-objective search; the semantic cache is skipped
+        logger.warning(f"Embedding objective queries failed ({e})")
+        query_vectors = None
     context_map = retrieve_context_for_objectives(
-        vector_store, module_name, learning_objectives, top_k_per_objective
+        vector_store, module_name, learning_objectives, top_k_per_objective,
+        query_vectors=query_vectors
     )
     
     # Summarize chunks for each learning objective
     logger.info("Summarizing context for each learning objective...")
-    objective_summaries = {}
-    for obj, chunks in context_map.items():
-        summary = summarize_chunks_for_objective(cfg, obj, chunks, module_name)
-        objective_summaries[obj] = summary
-        logger.debug(f"Summary for '{obj[:50]}...': {len(summary)} chars")
+    # Near-duplicate objectives seen before are served from the semantic cache
+    semantic_cache = _get_summary_cache(cfg) if query_vectors is not None else None
+    cached_summaries = {}
+    objective_vectors = {}
+    if semantic_cache is not None:
+        for obj, vector in zip(learning_objectives, query_vectors):
+            if obj in cached_summaries or obj in objective_vectors:
+                continue
+            cached = semantic_cache.lookup(vector)
+            if cached is not None:
+                cached_summaries[obj] = cached
+            else:
+                objective_vectors[obj] = vector
+        if cached_summaries:
+            logger.info(f"Semantic cache hits: {len(cached_summaries)}/{len(context_map)} objectives")
+    pending_map = {obj: chunks for obj, chunks in context_map.items() if obj not in cached_summaries}
+    
+    summaries = None
+    if not pending_map:
+        summaries = []
+    elif mg.get('batch_summaries', True):
+        summaries = await summarize_objectives_batched(
+            pending_map, sum_prompt, sum_max_tokens, sum_temperature
+        )
+    
+    if summaries is None:
+        # One request per objective, bounded to avoid swamping VLLM
+        semaphore = asyncio.Semaphore(mg.get('max_parallel_summaries') or 8)
+        
+        async def summarize(obj: str, chunks: List[Dict]) -> str:
+            async with semaphore:
+                summary = await summarize_chunks_for_objective(
+                    obj, chunks, module_name, sum_prompt, sum_max_tokens, sum_temperature
+                )
+            logger.debug(f"Summary for '{obj[:50]}...': {len(summary)} chars")
+            return summary
+        
+        summaries = await asyncio.gather(
+            *[summarize(obj, chunks) for obj, chunks in pending_map.items()]
+        )
+    new_summaries = dict(zip(pending_map, summaries))
+    
+    if semantic_cache is not None:
+        for obj, summary in new_summaries.items():
+            semantic_cache.add(objective_vectors[obj], summary)
+        semantic_cache.save()
+    
+    objective_summaries = {
+        obj: cached_summaries[obj] if obj in cached_summaries else new_summaries[obj]
+        for obj in context_map
+    }
     
     # Combine all summaries as reference material (not for direct presentation)
-    reference_context = ""
-    for i, (obj, summary) in enumerate(objective_summaries.items(), 1):
-        reference_context += f"[Reference {i}] {obj}\n{summary}\n\n"
+    reference_context = "".join(
+        f"[Reference {i}] {obj}\n{summary}\n\n"
+        for i, (obj, summary) in enumerate(objective_summaries.items(), 1)
+    )
     
     logger.info(f"Total reference context: {len(reference_context)} chars for {len(learning_objectives)} objectives")
     
@@ -366,7 +626,7 @@ def generate_module_content(cfg: DictConfig, module_name: str,
     # Build prompt using configured template
     objectives_text = "\n".join([f"{i+1}. {obj}" for i, obj in enumerate(learning_objectives)])
     
-    prompt = cfg.module_gen.content_generation_prompt_template.format(
+    prompt = mg.content_generation_prompt_template.format(
         module_name=module_name,
         objectives_text=objectives_text,
         pref_text=pref_text,
@@ -391,10 +651,10 @@ def generate_module_content(cfg: DictConfig, module_name: str,
     logger.info(f"Using max_tokens={max_output_tokens} for output generation")
     
     # Call LLM with optimized token allocation and configured temperature
-    result = infer_4b(
+    result = await infer_4b_async(
         prompt, 
         max_tokens=max_output_tokens, 
-        temperature=cfg.module_gen.generation_temperature
+        temperature=mg.generation_temperature
     )
     
     if not result.get('ok'):
@@ -410,7 +670,7 @@ def generate_module_content(cfg: DictConfig, module_name: str,
     
     # Extract content after </think> delimiter
     if '</think>' in clean_text.lower():
-        parts = re.split(r'</think>', clean_text, flags=re.IGNORECASE)
+        parts = _THINK_RE.split(clean_text)
         clean_text = parts[-1].strip()
         logger.debug("Removed thinking tokens using </think> tag")
     
@@ -446,6 +706,34 @@ def generate_module_content(cfg: DictConfig, module_name: str,
     return result_data
 
 
+def generate_module_content(cfg: DictConfig, module_name: str, 
+                           learning_objectives: List[str],
+                           user_preferences: Dict[str, Any],
+                           top_k_per_objective: Optional[int] = None) -> Dict[str, Any]:
+    """Generate structured module content based on learning objectives and user preferences.
+    
+    Synchronous entry point; runs generate_module_content_async on a fresh
+    event loop.
+    
+    Args:
+        cfg: Hydra configuration
+        module_name: Name of the module
+        learning_objectives: List of learning objectives
+        user_preferences: User preference dictionary
+        top_k_per_objective: Number of context chunks per objective (uses config default if None)
+        
+    Returns:
+        Generated module content with metadata
+        
+    Raises:
+        Exception if generation fails
+    """
+    return run_async(generate_module_content_async(
+        cfg, module_name, learning_objectives, user_preferences,
+        top_k_per_objective=top_k_per_objective
+    ))
+
+
 # ============================================================================
 # Main Entry Point
 # ============================================================================
@@ -477,8 +765,7 @@ def main(cfg: DictConfig) -> None:
         logger.error(f"Learning objectives file not found: {lo_path}")
         return
     
-    with open(lo_path) as f:
-        lo_data = json.load(f)
+    lo_data = _loads(lo_path.read_bytes())
     
     # Load user preferences
     pref_path = PROJECT_ROOT / pref_file
@@ -486,8 +773,7 @@ def main(cfg: DictConfig) -> None:
         logger.error(f"User preferences file not found: {pref_path}")
         return
     
-    with open(pref_path) as f:
-        user_prefs = json.load(f)
+    user_prefs = _loads(pref_path.read_bytes())
     
     # Get module name and objectives
     module_name = getattr(cfg.module_gen, 'module', None)
@@ -551,20 +837,23 @@ def main(cfg: DictConfig) -> None:
     
     # Add header with metadata if not already present
     if not markdown_content.startswith(f"# {module_name}"):
-        markdown_header = f"""# {module_name}
-
-**Generated:** {result['metadata']['generated_at']}  
-**Learning Objectives:** {result['metadata']['num_objectives']}
-
----
-
-## Learning Objectives
-
-"""
-        for i, obj in enumerate(learning_objectives, 1):
-            markdown_header += f"{i}. {obj}\n"
-        markdown_header += "\n---\n\n"
-        markdown_content = markdown_header + markdown_content
+        header_lines = [
+            f"# {module_name}",
+            "",
+            f"**Generated:** {result['metadata']['generated_at']}  ",
+            f"**Learning Objectives:** {result['metadata']['num_objectives']}",
+            "",
+            "---",
+            "",
+            "## Learning Objectives",
+            "",
+            *(f"{i}. {obj}" for i, obj in enumerate(learning_objectives, 1)),
+            "",
+            "---",
+            "",
+            "",
+        ]
+        markdown_content = "\n".join(header_lines) + markdown_content
     
     with open(md_file, "w", encoding="utf-8") as f:
         f.write(markdown_content)
@@ -572,8 +861,14 @@ def main(cfg: DictConfig) -> None:
     logger.info(f"📄 Saved module content (Markdown) to: {md_file}")
     
     # Save metadata JSON (optional, for programmatic access)
-    with open(json_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    pretty = cfg.module_gen.get('pretty', True)
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        with open(json_file, "wb") as f:
+            f.write(orjson.dumps(result, option=option))
+    else:
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2 if pretty else None, ensure_ascii=False)
     
     logger.info(f"� Saved metadata (JSON) to: {json_file}")
     
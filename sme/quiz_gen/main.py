@@ -1,41 +1,60 @@
 """Quiz Generator using OpenAI client for VLLM.
 
 Generates structured quiz questions from the entire content of an educational module.
+- Splits the module at its headings and generates each part's questions in parallel.
 - Uses the openai library to connect to a VLLM server.
 - Employs guided_json for reliable structured output.
 - Disables 'thinking' tokens for Qwen models.
 - Retrieves context from a FAISS vector store to enrich question generation.
 """
+import asyncio
+import functools
 import json
+import mmap
+import operator
 import os
+import re
+import threading
 import time
+import weakref
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional, Any, TypedDict
+from typing import TYPE_CHECKING, Annotated, List, Dict, Iterator, Optional, Any, TypedDict
 
 import hydra
+import numpy as np
 from loguru import logger
 from dotenv import load_dotenv
 from omegaconf import DictConfig
 
 # OpenAI client for VLLM interaction
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 # LangGraph for workflow management
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+from langgraph.constants import Send
 
-# Vector store imports for RAG
-try:
+# Vector store imports for RAG are deferred to first use (see load_vector_store),
+# so runs without a vector store don't pay for LangChain and the embedding stack
+if TYPE_CHECKING:
     from langchain_community.vectorstores import FAISS
     from langchain_huggingface import HuggingFaceEmbeddings
-    LANGCHAIN_AVAILABLE = True
-except ImportError:
-    LANGCHAIN_AVAILABLE = False
-    logger.error("LangChain components not available. RAG features will be disabled.")
 
 # Pydantic for structured output schema
 from pydantic import BaseModel, Field
 from typing import List as PydanticList
 
+# orjson encodes and decodes several times faster than the stdlib; its
+# JSONDecodeError subclasses json.JSONDecodeError, so handlers work for both
+try:
+    import orjson
+    _loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _loads = json.loads
+    ORJSON_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
@@ -47,11 +66,19 @@ VLLM_API_KEY = os.getenv('VLLM_API_KEY', 'dummy')
 # --- Project Configuration ---
 PROJECT_ROOT = Path(__file__).parent.parent
 
-# Log VLLM configuration for verification
-logger.info("VLLM Configuration:")
-logger.info(f"  Base URL: {VLLM_BASE_URL}")
-logger.info(f"  Model: {VLLM_MODEL}")
-logger.info(f"  API Key: {'***' if VLLM_API_KEY != 'dummy' else 'dummy'}")
+# AsyncOpenAI clients, one per event loop (their connections are bound to the
+# loop that opened them, and every workflow run uses its own asyncio.run loop)
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+# Enough keep-alive connections for every sub-batch of a fanned-out run
+_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+
+@functools.cache
+def _log_vllm_config() -> None:
+    """Logs the VLLM configuration for verification, once per process."""
+    logger.info("VLLM Configuration:")
+    logger.info(f"  Base URL: {VLLM_BASE_URL}")
+    logger.info(f"  Model: {VLLM_MODEL}")
+    logger.info(f"  API Key: {'***' if VLLM_API_KEY != 'dummy' else 'dummy'}")
 
 
 # ============================================================================
@@ -72,218 +99,726 @@ class QuizOutput(BaseModel):
     """The complete structure for the final quiz output."""
     questions: PydanticList[QuizQuestion] = Field(description="A list of all generated quiz questions.")
 
+# Built once; passed as guided_json on every request
+QUIZ_JSON_SCHEMA = QuizOutput.model_json_schema()
+
 # ============================================================================
 # State Management for LangGraph
 # ============================================================================
 
+class QuizSettings(TypedDict):
+    """Plain-Python snapshot of the quiz_gen config, taken once per run."""
+    prompt_template: str
+    num_questions: int
+    num_options: int
+    temperature: float
+    retrieval_top_k: int
+    max_subbatches: int
+    tokens_per_question: int
+    question_types: List[str]
+    output: Optional[str]
+    output_dir: str
+    pretty: bool
+
+def snapshot_settings(cfg: DictConfig) -> QuizSettings:
+    """Reads the quiz_gen values used by the workflow nodes out of the DictConfig."""
+    qcfg = cfg.quiz_gen
+    return QuizSettings(
+        prompt_template=str(qcfg.quiz_generation_prompt_template),
+        num_questions=int(qcfg.num_questions),
+        num_options=int(qcfg.mcq.num_options),
+        temperature=float(qcfg.temperature),
+        retrieval_top_k=int(qcfg.get("retrieval_top_k", 3)),
+        max_subbatches=int(qcfg.get("max_subbatches", 4) or 1),
+        tokens_per_question=int(qcfg.get("tokens_per_question", 400)),
+        question_types=list(qcfg.question_types),
+        output=qcfg.get("output"),
+        output_dir=str(qcfg.output_dir),
+        pretty=bool(qcfg.get("pretty", True)),
+    )
+
+def _first_error(current: Optional[str], new: Optional[str]) -> Optional[str]:
+    """Reducer for QuizState.error: keep the first error reported."""
+    return current or new
+
 class QuizState(TypedDict):
     """Defines the state that is passed between nodes in the LangGraph workflow."""
     module_name: str
     module_content: str
-    generated_questions: List[Dict[str, Any]]
+    # Sub-batches run in parallel and each appends its questions
+    generated_questions: Annotated[List[Dict[str, Any]], operator.add]
     final_quiz: Dict[str, Any]
-    config: DictConfig
+    settings: QuizSettings
     vector_store: Optional[Any]  # Holds the FAISS vector store instance
-    error: Optional[str]
+    query_batcher: Optional[Any]  # QueryBatcher over the vector store's embeddings
+    # A failed sub-batch is recorded here instead of failing the whole quiz
+    failed_subbatches: Annotated[List[str], operator.add]
+    error: Annotated[Optional[str], _first_error]
+
+class SubBatchState(TypedDict):
+    """Input of a single question-generation sub-batch dispatched via Send."""
+    module_name: str
+    module_content: str
+    num_questions: int
+    max_tokens: int
+    settings: QuizSettings
+    vector_store: Optional[Any]
+    query_batcher: Optional[Any]
 
 # ============================================================================
 # Vector Store (RAG) Functions
 # ============================================================================
 
-def load_vector_store(cfg: DictConfig) -> Optional[FAISS]:
-    """Loads a FAISS vector store from a local path for context retrieval."""
-    if not LANGCHAIN_AVAILABLE:
-        logger.warning("LangChain components not found. Cannot load vector store.")
+# Serializes loads so concurrent callers don't build the same model twice
+_LOAD_LOCK = threading.Lock()
+
+# Retrieved context per vector store, keyed by (query, top_k). Sub-batches and
+# repeated runs for a module all query with the module name. Each store keeps
+# its CONTEXT_CACHE_SIZE most recently used entries.
+CONTEXT_CACHE_SIZE = 256
+_CONTEXT_CACHE: "weakref.WeakKeyDictionary[Any, OrderedDict[tuple, str]]" = weakref.WeakKeyDictionary()
+_CONTEXT_CACHE_LOCK = threading.Lock()
+
+# Large stores ship an IVF-PQ copy of their index, built by chat.rag.create_vs,
+# which is searched instead of the flat index when it is current
+IVFPQ_NPROBE = 16
+IVFPQ_INDEX_FILE = "index_ivfpq.faiss"
+
+def resolve_embedding_device(device: Optional[str]) -> str:
+    """Resolves the configured embedding device.
+
+    "auto" picks CUDA when available; a CUDA device falls back to CPU when
+    torch or a GPU is missing.
+    """
+    device = str(device or "cpu")
+    if device != "auto" and not device.startswith("cuda"):
+        return device
+    try:
+        import torch
+        cuda_available = torch.cuda.is_available()
+    except ImportError:
+        cuda_available = False
+    if not cuda_available:
+        if device != "auto":
+            logger.warning(f"Embedding device {device} requested but CUDA is unavailable, using cpu")
+        return "cpu"
+    return "cuda" if device == "auto" else device
+
+@functools.lru_cache(maxsize=4)
+def _get_embeddings(model_name: str, device: str) -> "HuggingFaceEmbeddings":
+    """Loads an embedding model once per process and device."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    model_kwargs = {"device": device}
+    if device.startswith("cuda"):
+        # fp16 weights halve the matmul cost on GPU
+        model_kwargs["model_kwargs"] = {"torch_dtype": "float16"}
+    logger.info(f"Embedding model on device: {device}")
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
+    )
+
+@functools.lru_cache(maxsize=4)
+def _get_vector_store(vs_path: str, mtime_ns: int, model_name: str, device: str) -> "FAISS":
+    """Loads a vector store once per on-disk version (keyed by the index file's mtime)."""
+    from langchain_community.vectorstores import FAISS
+    vector_store = FAISS.load_local(
+        vs_path,
+        _get_embeddings(model_name, device),
+        allow_dangerous_deserialization=True
+    )
+    logger.info(f"✅ Successfully loaded vector store from {vs_path}")
+    try:
+        ivfpq = _load_ivfpq(Path(vs_path), vector_store.index.ntotal, mtime_ns)
+        if ivfpq is not None:
+            vector_store.index = ivfpq
+    except Exception as e:
+        logger.warning(f"Failed to load IVF-PQ index ({e}), using the flat index")
+    return vector_store
+
+def _load_ivfpq(vs_path: Path, ntotal: int, mtime_ns: int) -> Optional[Any]:
+    """Loads the store's prebuilt IVF-PQ index, if present and current.
+
+    The index is built alongside the store by chat.rag.create_vs; it is used
+    only when it is newer than index.faiss and holds the same vectors.
+    """
+    ivfpq_file = vs_path / IVFPQ_INDEX_FILE
+    if not ivfpq_file.exists() or ivfpq_file.stat().st_mtime_ns < mtime_ns:
+        return None
+
+    import faiss
+    ivfpq = faiss.read_index(str(ivfpq_file))
+    if ivfpq.ntotal != ntotal:
         return None
+    faiss.extract_index_ivf(ivfpq).nprobe = IVFPQ_NPROBE
+    logger.info(f"Loaded IVF-PQ index from {ivfpq_file}")
+    return ivfpq
 
+def load_vector_store(cfg: DictConfig) -> Optional["FAISS"]:
+    """Loads a FAISS vector store from a local path for context retrieval."""
     vs_path = PROJECT_ROOT / cfg.rag.vector_store_path
     course_id = cfg.quiz_gen.get('course_id')
     if course_id:
         vs_path = vs_path / str(course_id)
-        logger.info(f"Using course-specific vector store: {vs_path}")
+        logger.debug(f"Using course-specific vector store: {vs_path}")
 
     if not vs_path.exists():
         logger.warning(f"Vector store path does not exist: {vs_path}")
         return None
 
     try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name=cfg.rag.embedding_model_name,
-            model_kwargs={"device": "cpu"}
-        )
-        vector_store = FAISS.load_local(
-            str(vs_path),
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
-        logger.info(f"✅ Successfully loaded vector store from {vs_path}")
+        index_file = vs_path / "index.faiss"
+        mtime_ns = index_file.stat().st_mtime_ns if index_file.exists() else 0
+        device = resolve_embedding_device(cfg.rag.get("embedding_device", "cpu"))
+        with _LOAD_LOCK:
+            vector_store = _get_vector_store(str(vs_path), mtime_ns, cfg.rag.embedding_model_name, device)
         return vector_store
+    except ImportError as e:
+        logger.warning(f"LangChain components not found ({e}). Cannot load vector store.")
+        return None
     except Exception as e:
         logger.error(f"Failed to load vector store: {e}")
         return None
 
-def retrieve_context_from_vector_store(vector_store: FAISS, query: str, top_k: int = 3) -> str:
-    """Retrieves relevant context from the vector store based on a query."""
+def _cached_context(vector_store: "FAISS", query: str, top_k: int) -> Optional[str]:
+    """Returns previously retrieved context for (query, top_k), if any."""
+    key = (query, top_k)
+    with _CONTEXT_CACHE_LOCK:
+        entries = _CONTEXT_CACHE.get(vector_store)
+        if entries is None or key not in entries:
+            return None
+        entries.move_to_end(key)
+        return entries[key]
+
+def _cache_context(vector_store: "FAISS", query: str, top_k: int, context_text: str) -> None:
+    """Stores retrieved context, evicting the store's least recently used entry when full."""
+    with _CONTEXT_CACHE_LOCK:
+        entries = _CONTEXT_CACHE.setdefault(vector_store, OrderedDict())
+        entries[(query, top_k)] = context_text
+        entries.move_to_end((query, top_k))
+        if len(entries) > CONTEXT_CACHE_SIZE:
+            entries.popitem(last=False)
+
+def retrieve_context_from_vector_store(vector_store: Optional["FAISS"], query: str, top_k: int = 3,
+                                       query_vector: Optional[List[float]] = None) -> str:
+    """Retrieves relevant context from the vector store based on a query.
+
+    ``query_vector`` is the query's embedding, if already computed.
+    """
     if not vector_store:
         return "No vector store available."
 
+    cached = _cached_context(vector_store, query, top_k)
+    if cached is not None:
+        return cached
+
     try:
-        retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
-        docs = retriever.invoke(query)
+        # Search the raw FAISS index, skipping the LangChain retriever layer
+        if query_vector is None:
+            query_vector = vector_store.embeddings.embed_query(query)
+        vector = np.asarray([query_vector], dtype=np.float32)
+        if getattr(vector_store, "_normalize_L2", False):
+            vector = vector / np.linalg.norm(vector, axis=1, keepdims=True)
+        _, indices = vector_store.index.search(vector, top_k)
+        docs = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[int(idx)])
+            for idx in indices[0] if idx != -1
+        ]
         context_text = "\n\n".join(
             f"[Source {i+1} from Knowledge Base]:\n{doc.page_content}"
             for i, doc in enumerate(docs)
         )
+        _cache_context(vector_store, query, top_k, context_text)
         return context_text
     except Exception as e:
         logger.error(f"Failed to retrieve context from vector store: {e}")
         return "Failed to retrieve context."
 
+BATCH_WINDOW_MS = 5
+
+class QueryBatcher:
+    """Coalesces concurrent embedding requests into one embed_documents call.
+
+    Queries arriving within BATCH_WINDOW_MS of the first pending one are
+    embedded together in a single batched forward pass (identical queries
+    once). Bound to the event loop it is first used on.
+    """
+
+    def __init__(self, embeddings: Any, window_ms: float = BATCH_WINDOW_MS) -> None:
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def embed(self, query: str) -> List[float]:
+        """Returns the embedding of query, batched with other pending queries."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(query, []).append(future)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        await asyncio.sleep(self.window)
+        pending, self._pending = self._pending, {}
+        self._flush_task = None
+        queries = list(pending)
+        try:
+            vectors = await asyncio.to_thread(self.embeddings.embed_documents, queries)
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        logger.debug(f"Embedded {len(queries)} queries in one batch")
+        for query, vector in zip(queries, vectors):
+            for future in pending[query]:
+                if not future.done():
+                    future.set_result(vector)
+
+async def retrieve_context_async(vector_store: Optional["FAISS"], query: str, top_k: int,
+                                 batcher: Optional[QueryBatcher]) -> str:
+    """Async retrieve_context_from_vector_store that embeds through a QueryBatcher."""
+    if not vector_store:
+        return "No vector store available."
+    cached = _cached_context(vector_store, query, top_k)
+    if cached is not None:
+        return cached
+
+    query_vector = None
+    if batcher is not None:
+        try:
+            query_vector = await batcher.embed(query)
+        except Exception as e:
+            logger.error(f"Failed to retrieve context from vector store: {e}")
+            return "Failed to retrieve context."
+    # The search itself is CPU-bound, so keep it off the event loop
+    return await asyncio.to_thread(
+        retrieve_context_from_vector_store, vector_store, query, top_k, query_vector
+    )
+
 # ============================================================================
 # Content Loading
 # ============================================================================
 
+@functools.lru_cache(maxsize=32)
+def _read_text(path: str, mtime_ns: int, size: int) -> str:
+    """Reads a UTF-8 file once per (mtime, size) version.
+
+    The file is memory-mapped and decoded straight from the mapping, without
+    first copying it into a bytes object.
+    """
+    if size == 0:
+        return ""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = str(mm, 'utf-8')
+    # Match read_text's universal newline handling
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
 def load_module_content(content_path: str) -> Dict[str, Any]:
     """Loads module content from a markdown file."""
     content_file = Path(content_path)
     if not content_file.exists():
         raise FileNotFoundError(f"Module content file not found: {content_path}")
 
-    content = content_file.read_text(encoding='utf-8')
-    first_line = content.split('\n')[0].strip()
+    stat = content_file.stat()
+    content = _read_text(str(content_file.resolve()), stat.st_mtime_ns, stat.st_size)
+    first_line = content.partition('\n')[0].strip()
     module_name = first_line.lstrip('#').strip() if first_line.startswith('#') else "Unknown Module"
 
     logger.info(f"Loaded module: '{module_name}' ({len(content)} characters)")
     return {"module_name": module_name, "content": content}
 
+_HEADING_RE = re.compile(r'^(?=#{1,3} )', re.MULTILINE)
+
+# Sections shorter than this (e.g. a bare title) are merged into the next one
+_MIN_SECTION_CHARS = 500
+
+# Output token budgets a sub-batch's max_tokens is rounded up to; larger
+# sub-batches get their expected length so they are never truncated
+_MAX_TOKENS_BINS = (1024, 2048, 4096, 8192)
+
+def split_content(content: str, num_questions: int, max_parts: int) -> List[tuple]:
+    """Splits module content into contiguous parts and spreads the questions over them.
+
+    The content is cut at markdown headings (levels 1-3), sections shorter than
+    ``_MIN_SECTION_CHARS`` are merged into their neighbours, and the sections are
+    grouped into at most ``max_parts`` parts of similar length. Questions are
+    distributed in proportion to each part's length.
+
+    Returns:
+        List of (content_part, num_questions) tuples; every part gets at least one question
+    """
+    sections, pending = [], ""
+    for section in _HEADING_RE.split(content):
+        pending += section
+        if len(pending.strip()) >= _MIN_SECTION_CHARS:
+            sections.append(pending)
+            pending = ""
+    if pending.strip():
+        if sections:
+            sections[-1] += pending
+        else:
+            sections.append(pending)
+    n_parts = max(1, min(max_parts, num_questions, len(sections)))
+    if n_parts == 1:
+        return [(content, num_questions)]
+
+    # Greedily close a part once it reaches its share of the total length
+    target = len(content) / n_parts
+    parts, current = [], []
+    for i, section in enumerate(sections):
+        current.append(section)
+        remaining_sections = len(sections) - i - 1
+        remaining_parts = n_parts - len(parts) - 1
+        if remaining_parts and (sum(map(len, current)) >= target or remaining_sections == remaining_parts):
+            parts.append("".join(current))
+            current = []
+    if current:
+        parts.append("".join(current))
+
+    # One question per part, the rest handed out by length
+    counts = [1] * len(parts)
+    total_len = sum(map(len, parts))
+    extra = num_questions - len(parts)
+    shares = [extra * len(part) / total_len for part in parts]
+    for i, share in enumerate(shares):
+        counts[i] += int(share)
+    leftovers = sorted(range(len(parts)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in leftovers[:num_questions - sum(counts)]:
+        counts[i] += 1
+    return list(zip(parts, counts))
+
+def max_tokens_bin(num_questions: int, tokens_per_question: int) -> int:
+    """Rounds a sub-batch's expected output length up to the smallest fitting bin.
+
+    Returns the expected length itself when it exceeds the largest bin, so the
+    cap never falls below what the sub-batch needs.
+    """
+    expected = num_questions * tokens_per_question
+    return next((b for b in _MAX_TOKENS_BINS if b >= expected), expected)
+
+_JSON_TOKEN_RE = re.compile(r'[\[\]{}"]')
+
+class _QuestionStreamParser:
+    """Incremental parser for the streamed guided_json output.
+
+    Tracks bracket depth over the text fed so far (skipping string literals)
+    and decodes each object of {"questions": [...]} as soon as its closing
+    brace arrives, so questions are available before the response ends.
+    """
+
+    def __init__(self) -> None:
+        self.text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._start = -1  # Start of the question object being read
+
+    def feed(self, chunk: str) -> Iterator[Dict[str, Any]]:
+        """Append chunk and yield the question objects it completes."""
+        self.text += chunk
+        return self._scan()
+
+    def _scan(self) -> Iterator[Dict[str, Any]]:
+        text = self.text
+        i = self._pos
+        while True:
+            if self._in_string:
+                # Inside a string literal: find the closing unescaped quote
+                while True:
+                    i = text.find('"', i)
+                    if i == -1:
+                        self._pos = len(text)
+                        return
+                    backslashes = 0
+                    k = i - 1
+                    while text[k] == '\\':
+                        backslashes += 1
+                        k -= 1
+                    if backslashes % 2 == 0:
+                        break
+                    i += 1
+                self._in_string = False
+                i += 1
+                continue
+
+            match = _JSON_TOKEN_RE.search(text, i)
+            if match is None:
+                self._pos = len(text)
+                return
+            i = match.start()
+            self._pos = i + 1
+            char = text[i]
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                self._depth += 1
+                # Root object -> "questions" array -> question object
+                if self._depth == 3 and char == '{':
+                    self._start = i
+            else:
+                if self._depth == 3 and char == '}' and self._start >= 0:
+                    start, self._start = self._start, -1
+                    try:
+                        yield _loads(text[start:i + 1])
+                    except ValueError:
+                        pass
+                self._depth -= 1
+            i += 1
+
+# ============================================================================
+# VLLM Client
+# ============================================================================
+
+def _get_client() -> AsyncOpenAI:
+    """Returns the AsyncOpenAI client of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _CLIENTS.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            base_url=VLLM_BASE_URL,
+            api_key=VLLM_API_KEY,
+            http_client=DefaultAsyncHttpxClient(limits=_LIMITS)
+        )
+        _CLIENTS[loop] = client
+    return client
+
+async def _close_client() -> None:
+    """Closes the AsyncOpenAI client of the running event loop, if any."""
+    client = _CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
 # ============================================================================
 # LangGraph Workflow Nodes
 # ============================================================================
 
-def generate_questions_node(state: QuizState) -> QuizState:
+def fanout_questions(state: QuizState) -> List[Send]:
+    """Dispatches one generate_subbatch run per content part, executed in parallel."""
+    settings = state["settings"]
+    num_questions = settings["num_questions"]
+    tokens_per_question = settings["tokens_per_question"]
+    parts = split_content(state["module_content"], num_questions, settings["max_subbatches"])
+    logger.info(f"🤖 Generating {num_questions} quiz questions in {len(parts)} parallel sub-batches...")
+
+    return [
+        Send("generate_subbatch", {
+            "module_name": state["module_name"],
+            "module_content": part,
+            "num_questions": n,
+            "max_tokens": max_tokens_bin(n, tokens_per_question),
+            "settings": settings,
+            "vector_store": state.get("vector_store"),
+            "query_batcher": state.get("query_batcher"),
+        })
+        for part, n in parts
+    ]
+
+async def generate_subbatch_node(state: SubBatchState) -> Dict[str, Any]:
     """
-    Generates quiz questions from the entire module content using the VLLM server.
+    Generates quiz questions for one part of the module content using the VLLM server.
     """
-    logger.info("🤖 Generating quiz questions for the entire module...")
-    cfg = state["config"]
+    settings = state["settings"]
     content = state["module_content"]
+    num_questions = state["num_questions"]
     vector_store = state.get("vector_store")
 
     try:
         # 1. Retrieve additional context from the knowledge base (RAG)
-        retrieval_top_k = cfg.quiz_gen.get("retrieval_top_k", 3)
+        retrieval_top_k = settings["retrieval_top_k"]
         # Use the module name as the query for broad context retrieval
-        retrieved_context = retrieve_context_from_vector_store(
-            vector_store, state["module_name"], top_k=retrieval_top_k
+        retrieved_context = await retrieve_context_async(
+            vector_store, state["module_name"], retrieval_top_k, state.get("query_batcher")
         )
         logger.info(f"Retrieved {retrieval_top_k} context documents from the knowledge base.")
 
         # 2. Build the prompt
-        prompt = cfg.quiz_gen.quiz_generation_prompt_template.format(
+        prompt = settings["prompt_template"].format(
             module_content=content,
             retrieved_context=retrieved_context,
-            num_questions=cfg.quiz_gen.num_questions,
-            num_options=cfg.quiz_gen.mcq.num_options
+            num_questions=num_questions,
+            num_options=settings["num_options"]
         )
 
-        # 3. Initialize OpenAI client to connect to the VLLM server
-        client = OpenAI(base_url=VLLM_BASE_URL, api_key=VLLM_API_KEY)
-
-        # 4. Define extra parameters for VLLM-specific features
+        # 3. Define extra parameters for VLLM-specific features
         extra_body = {
             # Use guided_json for structured, valid JSON output based on Pydantic schema
-            "guided_json": QuizOutput.model_json_schema(),
+            "guided_json": QUIZ_JSON_SCHEMA,
             # Pass model-specific arguments, disabling 'thinking' for Qwen
             "chat_template_kwargs": {
                 "enable_thinking": False
             },
         }
 
-        # 5. Call the VLLM server
+        # 4. Call the VLLM server; sub-batches share the loop's client
         logger.info("Sending request to VLLM server with guided JSON...")
-        response = client.chat.completions.create(
+        stream = await _get_client().chat.completions.create(
             model=VLLM_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            temperature=cfg.quiz_gen.temperature,
+            temperature=settings["temperature"],
+            max_tokens=state["max_tokens"],
+            stream=True,
             extra_body=extra_body,
         )
 
-        # 6. Parse the structured response
-        response_content = response.choices[0].message.content
-        quiz_data = json.loads(response_content)
-        generated_questions = quiz_data.get("questions", [])
+        # 5. Parse questions as they stream in
+        parser = _QuestionStreamParser()
+        generated_questions = []
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if not content:
+                continue
+            for question in parser.feed(content):
+                generated_questions.append(question)
+                logger.debug(f"Received question {len(generated_questions)}/{num_questions}")
+
+        if not generated_questions:
+            # Fall back to decoding the whole response
+            generated_questions = _loads(parser.text).get("questions", [])
 
         if not generated_questions:
             raise ValueError("LLM returned an empty list of questions.")
 
         logger.info(f"✅ Successfully generated {len(generated_questions)} questions.")
-        state["generated_questions"] = generated_questions
+        return {"generated_questions": generated_questions}
 
     except Exception as e:
-        logger.error(f"Error in generate_questions_node: {e}")
-        state["error"] = f"Question generation failed: {e}"
-
-    return state
+        logger.error(f"Error in generate_subbatch_node: {e}")
+        return {"failed_subbatches": [f"Question generation failed: {e}"]}
 
-def aggregate_quiz_node(state: QuizState) -> QuizState:
+async def aggregate_quiz_node(state: QuizState) -> Dict[str, Any]:
     """Aggregates the generated questions into the final quiz format."""
     logger.info("📋 Aggregating final quiz...")
     if state.get("error"):
-        return state
+        return {}
+
+    failed_subbatches = state.get("failed_subbatches", [])
+    if not state["generated_questions"]:
+        return {"error": failed_subbatches[0] if failed_subbatches else "No questions were generated."}
+    if failed_subbatches:
+        logger.warning(f"{len(failed_subbatches)} sub-batch(es) failed; the quiz is built from the remaining ones.")
 
     try:
+        settings = state["settings"]
+        # Sub-batches number their questions independently
+        for i, question in enumerate(state["generated_questions"], 1):
+            question["id"] = i
+
         final_quiz = {
             "quiz_metadata": {
                 "module_name": state["module_name"],
                 "total_questions": len(state["generated_questions"]),
-                "question_types": list(state["config"].quiz_gen.question_types),
+                "question_types": list(settings["question_types"]),
                 "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "generation_method": "langgraph_vllm_full_content",
+                "generation_method": "langgraph_vllm_subbatches",
                 "generation_config": {
-                    "chunking_method": "full_content",
-                    "num_questions": state["config"].quiz_gen.num_questions,
-                    "temperature": state["config"].quiz_gen.temperature
-                }
+                    "chunking_method": "markdown_headings",
+                    "max_subbatches": settings["max_subbatches"],
+                    "num_questions": settings["num_questions"],
+                    "temperature": settings["temperature"]
+                },
+                "failed_subbatches": failed_subbatches
             },
             "questions": state["generated_questions"]
         }
-        state["final_quiz"] = final_quiz
         logger.info(f"Final quiz created with {len(state['generated_questions'])} questions.")
+        return {"final_quiz": final_quiz}
     except Exception as e:
         logger.error(f"Error in aggregate_quiz_node: {e}")
-        state["error"] = f"Quiz aggregation failed: {e}"
+        return {"error": f"Quiz aggregation failed: {e}"}
+
+def _dumps(data: Any, pretty: bool) -> bytes:
+    """Serializes data to UTF-8 JSON, indented by 2 when pretty."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+    return json.dumps(data, indent=2 if pretty else None, ensure_ascii=False).encode('utf-8')
 
-    return state
+class QuizWriter:
+    """Writes a quiz JSON file incrementally.
 
-def save_quiz_node(state: QuizState) -> QuizState:
+    The metadata is written on enter, each question as it is passed to
+    write_question(), and the closing brackets on exit, so the file is never
+    serialized as one string. Pretty output matches an indent=2 dump of the
+    whole quiz.
+    """
+
+    def __init__(self, path: Path, metadata: Dict[str, Any], pretty: bool = True) -> None:
+        self.path = path
+        self.metadata = metadata
+        self.pretty = pretty
+        self.count = 0
+        self._file = None
+
+    def _dumps(self, data: Any, level: int) -> bytes:
+        encoded = _dumps(data, self.pretty)
+        # Raw newlines only occur between tokens, so this re-indents safely
+        return encoded.replace(b'\n', b'\n' + b'  ' * level) if self.pretty else encoded
+
+    def __enter__(self) -> "QuizWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'wb')
+        metadata = self._dumps(self.metadata, 1)
+        if self.pretty:
+            self._file.write(b'{\n  "quiz_metadata": ' + metadata + b',\n  "questions": [')
+        else:
+            self._file.write(b'{"quiz_metadata":' + metadata + b',"questions":[')
+        return self
+
+    def write_question(self, question: Dict[str, Any]) -> None:
+        """Appends a question to the questions list."""
+        separator = b',' if self.count else b''
+        indent = b'\n    ' if self.pretty else b''
+        self._file.write(separator + indent + self._dumps(question, 2))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                closing = b'\n  ]\n}' if self.pretty and self.count else (b']\n}' if self.pretty else b']}')
+                self._file.write(closing)
+        finally:
+            self._file.close()
+
+def _write_quiz(path: Path, quiz: Dict[str, Any], pretty: bool) -> None:
+    """Writes a quiz to path through a QuizWriter."""
+    with QuizWriter(path, quiz["quiz_metadata"], pretty=pretty) as writer:
+        for question in quiz["questions"]:
+            writer.write_question(question)
+
+async def save_quiz_node(state: QuizState) -> Dict[str, Any]:
     """Saves the final quiz to a JSON file."""
     logger.info("💾 Saving quiz to output file...")
     if state.get("error"):
-        return state
+        return {}
 
     try:
-        output_path_str = state["config"].quiz_gen.get("output")
+        settings = state["settings"]
+        output_path_str = settings["output"]
         if output_path_str:
             output_path = Path(output_path_str)
         else:
             timestamp = time.strftime("%Y%m%d-%H%M%S")
             module_name_safe = state["module_name"].lower().replace(' ', '_')
             filename = f"quiz-{module_name_safe}-{timestamp}.json"
-            output_dir = PROJECT_ROOT / state["config"].quiz_gen.output_dir
+            output_dir = PROJECT_ROOT / settings["output_dir"]
             output_path = output_dir / filename
 
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(state["final_quiz"], f, indent=2, ensure_ascii=False)
+        # Stream the quiz to disk off the event loop
+        await asyncio.to_thread(_write_quiz, output_path, state["final_quiz"], settings["pretty"])
 
         logger.info(f"Quiz saved to: {output_path}")
         print_quiz_summary(state["final_quiz"], output_path)
 
     except Exception as e:
         logger.error(f"Error in save_quiz_node: {e}")
-        state["error"] = f"Quiz saving failed: {e}"
+        return {"error": f"Quiz saving failed: {e}"}
 
-    return state
+    return {}
 
 def print_quiz_summary(quiz_data: Dict[str, Any], output_path: Path) -> None:
     """Prints a formatted summary of the generated quiz to the console."""
@@ -309,13 +844,13 @@ def create_quiz_workflow() -> StateGraph:
     workflow = StateGraph(QuizState)
 
     # Define the nodes
-    workflow.add_node("generate_questions", generate_questions_node)
+    workflow.add_node("generate_subbatch", generate_subbatch_node)
     workflow.add_node("aggregate_quiz", aggregate_quiz_node)
     workflow.add_node("save_quiz", save_quiz_node)
 
-    # Define the workflow edges
-    workflow.set_entry_point("generate_questions")
-    workflow.add_edge("generate_questions", "aggregate_quiz")
+    # Define the workflow edges; the sub-batches run in parallel
+    workflow.add_conditional_edges(START, fanout_questions, ["generate_subbatch"])
+    workflow.add_edge("generate_subbatch", "aggregate_quiz")
     workflow.add_edge("aggregate_quiz", "save_quiz")
     workflow.add_edge("save_quiz", END)
 
@@ -323,6 +858,7 @@ def create_quiz_workflow() -> StateGraph:
 
 def run_quiz_generation_workflow(cfg: DictConfig, module_data: Dict[str, Any]) -> Dict[str, Any]:
     """Initializes the state and runs the quiz generation workflow."""
+    _log_vllm_config()
     logger.info("🚀 Starting LangGraph quiz generation workflow...")
 
     vector_store = load_vector_store(cfg)
@@ -332,13 +868,25 @@ def run_quiz_generation_workflow(cfg: DictConfig, module_data: Dict[str, Any]) -
         module_content=module_data["content"],
         generated_questions=[],
         final_quiz={},
-        config=cfg,
+        settings=snapshot_settings(cfg),
         vector_store=vector_store,
+        query_batcher=None,
+        failed_subbatches=[],
         error=None
     )
 
     workflow = create_quiz_workflow()
-    final_state = workflow.invoke(initial_state)
+
+    async def _run() -> Dict[str, Any]:
+        # Created inside the loop its futures belong to
+        if vector_store is not None:
+            initial_state["query_batcher"] = QueryBatcher(vector_store.embeddings)
+        try:
+            return await workflow.ainvoke(initial_state)
+        finally:
+            await _close_client()
+
+    final_state = asyncio.run(_run())
 
     if final_state.get("error"):
         raise Exception(final_state["error"])
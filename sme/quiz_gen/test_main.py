@@ -0,0 +1,22 @@
+"""Tests for the quiz generator's sub-batch sizing."""
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("openai")
+
+_spec = importlib.util.spec_from_file_location("quiz_gen_main", Path(__file__).with_name("main.py"))
+quiz_gen_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(quiz_gen_main)
+
+
+def test_max_tokens_bin_rounds_up_to_smallest_bin():
+    assert quiz_gen_main.max_tokens_bin(3, 300) == 1024
+    assert quiz_gen_main.max_tokens_bin(5, 400) == 2048
+
+
+def test_max_tokens_bin_never_caps_below_expected():
+    # A module without headings is a single sub-batch for all its questions
+    assert quiz_gen_main.max_tokens_bin(25, 400) == 10000